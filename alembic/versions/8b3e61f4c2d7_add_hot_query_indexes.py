@@ -0,0 +1,51 @@
+"""add hot query indexes
+
+Revision ID: 8b3e61f4c2d7
+Revises: 5d2f0c8e9a41
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b3e61f4c2d7"
+down_revision: Union[str, Sequence[str], None] = "5d2f0c8e9a41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = (
+    ("ix_messages_chat_id_created_at_id", "messages", ["chat_id", "created_at", "id"]),
+    ("ix_chat_users_user_id_chat_id", "chat_users", ["user_id", "chat_id"]),
+    ("ix_email_verifications_token_hash", "email_verifications", ["token_hash"]),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, but it doesn't
+    # lock the tables against writes while the indexes are built
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
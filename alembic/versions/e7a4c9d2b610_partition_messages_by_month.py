@@ -0,0 +1,100 @@
+"""partition messages by month
+
+Revision ID: e7a4c9d2b610
+Revises: 8b3e61f4c2d7
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from shared.chat.partitions import (
+    DEFAULT_PARTITION_DDL,
+    add_months,
+    month_start,
+    months_between,
+    partition_ddl,
+)
+from shared.settings import settings
+
+# revision identifiers, used by Alembic.
+revision: str = "e7a4c9d2b610"
+down_revision: Union[str, Sequence[str], None] = "8b3e61f4c2d7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "chat_id, user_id, content, created_at, id"
+
+
+def create_messages_table(*constraints, **kw) -> None:
+    op.create_table(
+        "messages",
+        sa.Column("chat_id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("content", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        *constraints,
+        **kw,
+    )
+    op.create_index(
+        "ix_messages_chat_id_created_at_id",
+        "messages",
+        ["chat_id", "created_at", "id"],
+    )
+
+
+def rename_old_table(suffix: str) -> None:
+    # Index names are schema-wide, move them out of the way of the new table
+    op.rename_table("messages", f"messages_{suffix}")
+    op.execute(f"ALTER INDEX messages_pkey RENAME TO messages_{suffix}_pkey")
+    op.execute(
+        "ALTER INDEX ix_messages_chat_id_created_at_id "
+        f"RENAME TO ix_messages_{suffix}_chat_id_created_at_id"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    rename_old_table("unpartitioned")
+    create_messages_table(
+        sa.PrimaryKeyConstraint("created_at", "id"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+
+    now = datetime.now(timezone.utc)
+    oldest = bind.execute(
+        sa.text("SELECT min(created_at) FROM messages_unpartitioned")
+    ).scalar()
+    # Same window ensure_message_partitions keeps, stretched back to the
+    # oldest existing message
+    first = add_months(month_start(now), -1)
+    if oldest is not None:
+        first = min(first, month_start(oldest))
+    last = add_months(month_start(now), settings.chat.PARTITION_MONTHS_AHEAD)
+    for month in months_between(first, last):
+        bind.exec_driver_sql(partition_ddl(month))
+    bind.exec_driver_sql(DEFAULT_PARTITION_DDL)
+
+    op.execute(
+        f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_unpartitioned"
+    )
+    op.drop_table("messages_unpartitioned")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    rename_old_table("partitioned")
+    create_messages_table(sa.PrimaryKeyConstraint("id"))
+    op.execute(
+        f"INSERT INTO messages ({COLUMNS}) SELECT {COLUMNS} FROM messages_partitioned"
+    )
+    # Drops the partitions with it
+    op.drop_table("messages_partitioned")
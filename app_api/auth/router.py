@@ -9,7 +9,7 @@ from ddd_shared.application.usecases.user.register import (
     UserRegisterCommand,
     UserRegisterUseCase,
 )
-from shared.auth.dependencies import GetCurrentUserByRefreshDep, GetCurrentUserDep
+from shared.auth.dependencies import GetCurrentDBUserDep, GetCurrentUserByRefreshDep
 from shared.auth.schemas import (
     EmailSendS,
     TokenS,
@@ -19,6 +19,7 @@ from shared.auth.schemas import (
 from shared.auth.services import AuthService
 from shared.auth.utils import (
     create_access_token,
+    create_principal_claims,
     create_refresh_token,
 )
 from shared.database import SessionDep
@@ -77,8 +78,10 @@ async def login(
     session: FromDishka[AsyncSession], response: Response, user: UserAuthenticateS
 ) -> TokenS:
     user = await AuthService.authenticate_user(session, user)
-    access_token = create_access_token({"sub": user.username})
-    refresh_token = create_refresh_token({"sub": user.username})
+    access_token = create_access_token(create_principal_claims(user))
+    refresh_token = create_refresh_token(
+        {"sub": user.username, "ver": user.token_version}
+    )
 
     response.set_cookie(
         key="refresh_token",
@@ -92,7 +95,7 @@ async def login(
 
 
 @router.get("/me")
-def read_users_me(current_user: GetCurrentUserDep) -> UserS:
+def read_users_me(current_user: GetCurrentDBUserDep) -> UserS:
     return current_user
 
 
@@ -104,14 +107,14 @@ def read_users_me(current_user: GetCurrentUserDep) -> UserS:
 async def refresh_token(
     current_user: GetCurrentUserByRefreshDep,
 ) -> TokenS:
-    access_token = create_access_token({"sub": current_user.username})
+    access_token = create_access_token(create_principal_claims(current_user))
 
     return TokenS(access_token=access_token, token_type="bearer")
 
 
 @router.post("/change-password")
 async def change_password(
-    data: UserChangePasswordS, current_user: GetCurrentUserDep, session: SessionDep
+    data: UserChangePasswordS, current_user: GetCurrentDBUserDep, session: SessionDep
 ):
     await AuthService.change_user_password(
         session, current_user, data.current_password, data.new_password
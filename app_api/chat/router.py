@@ -1,18 +1,24 @@
 import logging
+from datetime import datetime
+from typing import AsyncIterator, Optional
 from uuid import UUID
 
 from fastapi import (
     APIRouter,
-    Depends,
+    Query,
+    Response,
+    status,
 )
+from fastapi.responses import StreamingResponse
 
-from shared.auth.dependencies import GetCurrentUserDep, get_current_user
+from shared.auth.dependencies import GetCurrentUserDep
 from shared.chat.models import ChatType
-from shared.chat.schemas import ChatCreateS, ChatS
+from shared.chat.schemas import ChatCreateS, ChatS, MessagePageS
 from shared.chat.services import ChatService
-from shared.database import SessionDep
-from shared.error.custom_exceptions import NotFoundError
-from shared.users.models import User
+from shared.chat.utils import encode_ndjson
+from shared.database import SessionDep, session_context
+from shared.error.custom_exceptions import AuthorizationError, NotFoundError
+from shared.settings import settings
 from shared.users.services import UserService
 
 logger = logging.getLogger(__name__)
@@ -26,9 +32,17 @@ async def get_chat(chat_id: UUID, session: SessionDep):
     return {"chat": db_chat}
 
 
-@router.delete("/{chat_id}")
-async def delete_chat(chat_id: UUID, session: SessionDep):
-    await ChatService
+@router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_chat(chat_id: UUID, session: SessionDep, user: GetCurrentUserDep):
+    db_chat = await ChatService.get_chat(session, chat_id)
+    chat_user = await ChatService.get_chat_user(session, chat_id, user.id)
+    if chat_user is None:
+        raise NotFoundError(message="Chat not found")
+    # either side may delete a private chat, group chats only by their admins
+    if db_chat.type == ChatType.GROUP and not chat_user.is_admin:
+        raise AuthorizationError
+    await ChatService.delete_chat(session, db_chat)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post("/group")
@@ -53,12 +67,12 @@ async def create_private_chat(
 async def add_user_to_chat(
     chat_id: UUID,
     session: SessionDep,
-    user: User = Depends(get_current_user),
+    user: GetCurrentUserDep,
 ):
     chat = await ChatService.get_chat(session, chat_id)
     if chat.type == ChatType.PRIVATE:
         raise NotFoundError(message="Chat not found")
-    await ChatService.add_user_to_chat(session, chat_id, user)
+    await ChatService.add_user_to_chat(session, chat, user)
     return {"message": "User joined to chat successfully."}
 
 
@@ -71,9 +85,58 @@ async def get_chat_users(chat_id: UUID, session: SessionDep):
 
 
 @router.get("/{chat_id}/messages")
-async def get_chat_messages(chat_id: UUID, session: SessionDep):
-    messages = await ChatService.get_messages_by_chat(session, chat_id)
-    return {"messages": messages}
+async def get_chat_messages(
+    chat_id: UUID,
+    session: SessionDep,
+    limit: int = Query(
+        settings.chat.HISTORY_PAGE_SIZE, ge=1, le=settings.chat.HISTORY_MAX_PAGE_SIZE
+    ),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> MessagePageS:
+    return await ChatService.get_messages_by_chat(
+        session, chat_id, limit, before=before, after=after
+    )
+
+
+async def stream_chat_export(
+    chat_id: UUID,
+    compress: bool,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> AsyncIterator[bytes]:
+    # The request's session is closed before the body is streamed, so the
+    # cursor gets a session of its own for the lifetime of the response
+    async with session_context() as session:
+        batches = ChatService.stream_messages(
+            session, chat_id, settings.chat.EXPORT_BATCH_SIZE, since, until
+        )
+        async for chunk in encode_ndjson(batches, compress):
+            yield chunk
+
+
+@router.get("/{chat_id}/messages/export")
+async def export_chat_messages(
+    chat_id: UUID,
+    session: SessionDep,
+    user: GetCurrentUserDep,
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> StreamingResponse:
+    await ChatService.get_chat(session, chat_id)
+    if await ChatService.get_chat_user(session, chat_id, user.id) is None:
+        raise NotFoundError(message="Chat not found")
+    filename = f"chat-{chat_id}.ndjson"
+    media_type = "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        stream_chat_export(chat_id, gzip, since, until),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @router.get("/user_chats/{user_id}")
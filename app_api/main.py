@@ -1,3 +1,4 @@
+import asyncio
 import uuid
 from contextlib import asynccontextmanager
 
@@ -12,10 +13,15 @@ from app_api.media.router import router as media_router
 from app_api.push_notification.router import router as push_router
 from app_api.users.router import router as users_router
 from ddd_shared.bootstrap.ioc.container import get_container
+from shared.auth.cache import verified_token_cache
+from shared.chat.cache import chat_members_cache, recent_messages_cache
+from shared.chat.partitions import run_partition_maintenance
+from shared.core.serialization import FastJSONResponse
 from shared.database import engine
 from shared.error.exception_handlers import setup_custom_exception_handlers
 from shared.rabbit.rabbit_manager import rabbit_manager
 from shared.settings import log_settings, settings
+from shared.users.cache import user_cache
 
 
 @asynccontextmanager
@@ -23,12 +29,37 @@ async def lifestyle(app: FastAPI):
     log_settings()
     settings.media.upload_path.mkdir(exist_ok=True)
     await rabbit_manager.connect()
+    await user_cache.connect()
+    await chat_members_cache.connect()
+    await recent_messages_cache.connect()
+    app.state.user_invalidation_task = asyncio.create_task(
+        user_cache.listen_invalidations()
+    )
+    app.state.recent_invalidation_task = asyncio.create_task(
+        recent_messages_cache.listen_invalidations()
+    )
+    app.state.partition_task = asyncio.create_task(run_partition_maintenance())
     yield
+    for task in (
+        app.state.user_invalidation_task,
+        app.state.recent_invalidation_task,
+        app.state.partition_task,
+    ):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await recent_messages_cache.close()
+    await chat_members_cache.close()
+    await user_cache.close()
     await rabbit_manager.close()
     await engine.dispose()
 
 
-app = FastAPI(lifespan=lifestyle, root_path="/api")
+app = FastAPI(
+    lifespan=lifestyle, root_path="/api", default_response_class=FastJSONResponse
+)
 
 
 setup_custom_exception_handlers(app)
@@ -55,6 +86,16 @@ def read_root():
     return "Hello"
 
 
+@app.get("/stats")
+async def get_stats():
+    return {
+        "user_cache": user_cache.stats(),
+        "chat_members_cache": chat_members_cache.stats(),
+        "recent_messages_cache": recent_messages_cache.stats(),
+        "verified_token_cache": verified_token_cache.stats(),
+    }
+
+
 container: AsyncContainer = get_container()
 
 setup_dishka(container, app)
@@ -3,14 +3,24 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from shared.chat.cache import chat_members_cache, recent_messages_cache
+from shared.chat.partitions import run_partition_maintenance
+from shared.chat.writer import message_writer
 from shared.database import engine
 from shared.error.exception_handlers import setup_custom_exception_handlers
 from shared.rabbit.rabbit_consumer import rabbit_consumer
 from shared.rabbit.rabbit_manager import rabbit_manager
-from shared.redis import redis_chat_subscribe, redis_push_notifications_subscribe
+from shared.redis import (
+    redis_chat_subscribe,
+    redis_manager,
+    redis_push_notifications_subscribe,
+)
 from shared.settings import log_settings, settings
+from shared.users.cache import user_cache
 
+from .rate_limit import rate_limiter
 from .router import router
+from .ws_manager import manager
 
 
 @asynccontextmanager
@@ -18,6 +28,11 @@ async def lifestyle(app: FastAPI):
     log_settings()
     settings.media.upload_path.mkdir(exist_ok=True)
     await rabbit_manager.connect()
+    await redis_manager.connect()
+    await user_cache.connect(redis_manager.redis, redis_manager.pubsub_redis)
+    await chat_members_cache.connect(redis_manager.redis, redis_manager.pubsub_redis)
+    await recent_messages_cache.connect(redis_manager.redis)
+    await rate_limiter.connect(redis_manager.redis)
     app.state.rabbit_task = asyncio.create_task(
         rabbit_consumer.consume("push_notifications")
     )
@@ -25,6 +40,14 @@ async def lifestyle(app: FastAPI):
     app.state.redis_push_notification_task = asyncio.create_task(
         redis_push_notifications_subscribe()
     )
+    app.state.user_invalidation_task = asyncio.create_task(
+        user_cache.listen_invalidations()
+    )
+    app.state.chat_members_invalidation_task = asyncio.create_task(
+        chat_members_cache.listen_invalidations()
+    )
+    app.state.reaper_task = asyncio.create_task(manager.run_reaper())
+    app.state.partition_task = asyncio.create_task(run_partition_maintenance())
     try:
         yield
     finally:
@@ -34,17 +57,30 @@ async def lifestyle(app: FastAPI):
         app.state.rabbit_task.cancel()
         app.state.redis_chat_task.cancel()
         app.state.redis_push_notification_task.cancel()
+        app.state.user_invalidation_task.cancel()
+        app.state.chat_members_invalidation_task.cancel()
+        app.state.reaper_task.cancel()
+        app.state.partition_task.cancel()
 
         for task in (
             app.state.rabbit_task,
             app.state.redis_chat_task,
             app.state.redis_push_notification_task,
+            app.state.user_invalidation_task,
+            app.state.chat_members_invalidation_task,
+            app.state.reaper_task,
+            app.state.partition_task,
         ):
             try:
                 await task
             except asyncio.CancelledError:
                 pass
 
+        await message_writer.close()
+        await user_cache.close()
+        await chat_members_cache.close()
+        await recent_messages_cache.close()
+        await redis_manager.close()
         await engine.dispose()
 
 
@@ -0,0 +1,85 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+from uuid import UUID
+
+import msgpack
+
+from shared.core.serialization import dumps_str, loads
+
+JSON_PROTOCOL = "json"
+# Binary frames in both directions, negotiated via Sec-WebSocket-Protocol
+MSGPACK_PROTOCOL = "chat.msgpack.v1"
+
+SUBPROTOCOLS = (MSGPACK_PROTOCOL,)
+
+
+def negotiate_protocol(requested: Iterable[str]) -> Optional[str]:
+    """
+    Pick the first subprotocol offered by the client that we support, None
+    keeps the JSON default.
+    """
+    for protocol in requested:
+        if protocol in SUBPROTOCOLS:
+            return protocol
+    return None
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def pack(data: Any) -> bytes:
+    return msgpack.packb(data, default=_msgpack_default)
+
+
+def unpack(raw: bytes) -> Any:
+    return msgpack.unpackb(raw)
+
+
+_MSGPACK_BATCH_HEADER = b"\x82" + pack("action") + pack("batch") + pack("events")
+
+
+def batch_frames(frames: List[Union[str, bytes]], protocol: str) -> Union[str, bytes]:
+    """
+    Join already encoded frames into one {"action": "batch", "events": [...]}
+    frame without decoding them.
+    """
+    if protocol == MSGPACK_PROTOCOL:
+        array_header = msgpack.Packer().pack_array_header(len(frames))
+        return _MSGPACK_BATCH_HEADER + array_header + b"".join(frames)
+    return '{"action":"batch","events":[' + ",".join(frames) + "]}"
+
+
+class Frame:
+    """
+    Outgoing payload encoded lazily, at most once per protocol, however many
+    sockets it is sent to.
+    """
+
+    __slots__ = ("_data", "_encoded")
+
+    def __init__(self, data: Optional[dict] = None, text: Optional[str] = None):
+        self._data = data
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+        if text is not None:
+            self._encoded[JSON_PROTOCOL] = text
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = loads(self._encoded[JSON_PROTOCOL])
+        return self._data
+
+    def encode(self, protocol: str) -> Union[str, bytes]:
+        encoded = self._encoded.get(protocol)
+        if encoded is None:
+            if protocol == MSGPACK_PROTOCOL:
+                encoded = pack(self.data)
+            else:
+                encoded = dumps_str(self.data)
+            self._encoded[protocol] = encoded
+        return encoded
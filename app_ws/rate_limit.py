@@ -0,0 +1,158 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from uuid import UUID
+
+import aioredis
+
+from shared.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the time passed since the last call, then takes
+# ARGV[3] tokens if there are enough. Returns 0 or the ms until there will be.
+# Time comes from the Redis clock, so skewed workers share one bucket fairly.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = math.ceil((cost - tokens) * 1000 / rate)
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst * 1000 / rate))
+return retry_after
+"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float
+    burst: int
+
+
+class TokenBucket:
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost: int = 1) -> float:
+        """
+        Take cost tokens. Returns 0 on success, otherwise the seconds until
+        enough tokens are available.
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate
+        )
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.limit.rate
+
+    def refund(self, cost: int = 1):
+        """
+        Give back tokens taken for an action that was not performed.
+        """
+        self.tokens = min(self.limit.burst, self.tokens + cost)
+
+
+def default_limits() -> Dict[str, Dict[str, Limit]]:
+    config = settings.rate_limit
+    return {
+        "connection": {
+            "message": Limit(
+                config.CONNECTION_MESSAGE_RATE, config.CONNECTION_MESSAGE_BURST
+            ),
+            "subscribe": Limit(
+                config.CONNECTION_SUBSCRIBE_RATE, config.CONNECTION_SUBSCRIBE_BURST
+            ),
+        },
+        "user": {
+            "message": Limit(config.USER_MESSAGE_RATE, config.USER_MESSAGE_BURST),
+            "subscribe": Limit(config.USER_SUBSCRIBE_RATE, config.USER_SUBSCRIBE_BURST),
+        },
+    }
+
+
+class RateLimiter:
+    """
+    Token buckets per action: one per connection kept in process, one per
+    user kept in Redis so the limit holds across workers. Without Redis only
+    the connection buckets apply.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, Limit]]] = None,
+        enabled: bool = settings.rate_limit.ENABLED,
+    ):
+        self.limits = limits or default_limits()
+        self.enabled = enabled
+        self.redis: Optional[aioredis.Redis] = None
+        self._script = None
+        self.limited: Dict[str, int] = {}
+
+    async def connect(self, redis: aioredis.Redis):
+        self.redis = redis
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def connection_buckets(self) -> Dict[str, TokenBucket]:
+        return {
+            action: TokenBucket(limit)
+            for action, limit in self.limits["connection"].items()
+        }
+
+    async def hit(
+        self, user_id: UUID, action: str, buckets: Dict[str, TokenBucket]
+    ) -> float:
+        """
+        Count one action of the user on a connection. Returns 0 if it is
+        allowed, otherwise the seconds to wait before retrying.
+        """
+        if not self.enabled:
+            return 0.0
+        retry_after = 0.0
+        bucket = buckets.get(action)
+        if bucket is not None:
+            retry_after = bucket.take()
+        if not retry_after:
+            retry_after = await self._take_shared(user_id, action)
+            if retry_after and bucket is not None:
+                # The action is rejected, it shouldn't count on this connection
+                bucket.refund()
+        if retry_after:
+            self.limited[action] = self.limited.get(action, 0) + 1
+        return retry_after
+
+    async def _take_shared(self, user_id: UUID, action: str) -> float:
+        limit = self.limits["user"].get(action)
+        if limit is None or self._script is None:
+            return 0.0
+        try:
+            retry_after_ms = await self._script(
+                keys=[f"rate_limit:{action}:{user_id}"],
+                args=[limit.rate, limit.burst, 1],
+            )
+        except Exception as e:
+            logger.error(f"Couldn't check rate limit of user {user_id}: {e}")
+            return 0.0
+        return int(retry_after_ms) / 1000
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "limited": dict(self.limited)}
+
+
+rate_limiter = RateLimiter()
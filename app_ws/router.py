@@ -1,16 +1,26 @@
-import json
+import asyncio
 import logging
 
 from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
 from fastapi.websockets import WebSocketState
 from pydantic import ValidationError
 
+from shared.auth.cache import verified_token_cache
 from shared.auth.services import AuthService
-from shared.auth.utils import decode_jwt
-from shared.database import SessionDep
-from shared.error.custom_exceptions import CredentialError
-from shared.redis import redis_publish
+from shared.auth.utils import decode_jwt_cached
+from shared.chat.cache import chat_members_cache, recent_messages_cache
+from shared.chat.schemas import MessageInfoS
+from shared.chat.writer import message_writer
+from shared.database import session_context
+from shared.error.custom_exceptions import CredentialError, IntegrityError
+from shared.redis import chat_bus
+from shared.users.cache import user_cache
+from shared.users.schemas import UserSlimS
+from shared.websocket.schemas import WSMessage, WSPong, WSSubscribe
 
+from .protocols import JSON_PROTOCOL, MSGPACK_PROTOCOL, negotiate_protocol
+from .rate_limit import rate_limiter
+from .services import chat_ws_service
 from .utils import parse_ws_message
 from .ws_manager import manager
 
@@ -19,39 +29,196 @@ router = APIRouter(tags=["ws"])
 logger = logging.getLogger(__name__)
 
 
-@router.websocket("/ws")
-async def websocket_chat(
-    websocket: WebSocket,
-    session: SessionDep,
-    token: str = Query(...),
+@router.get("/stats")
+async def get_stats():
+    return {
+        "outbound": manager.outbound_stats(),
+        "user_cache": user_cache.stats(),
+        "chat_members_cache": chat_members_cache.stats(),
+        "recent_messages_cache": recent_messages_cache.stats(),
+        "verified_token_cache": verified_token_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+    }
+
+
+async def send_message_error(user: UserSlimS, error: str):
+    await manager.send_json_to_user(
+        user.id,
+        {
+            "action": "message_response",
+            "status": "error",
+            "error": error,
+        },
+    )
+
+
+async def handle_chat_message(user: UserSlimS, ws_message: WSMessage):
+    """
+    Authorize and persist the message once at ingress, then publish it for
+    fan-out. A failure is reported to the sender and keeps the socket open.
+    """
+    try:
+        if not await chat_members_cache.is_member(ws_message.chat_id, user.id):
+            await send_message_error(user, "no access")
+            return
+        db_message = await message_writer.write(
+            ws_message.chat_id, user.id, ws_message.text
+        )
+    except IntegrityError as e:
+        logger.error(f"Couldn't save message: {e.message}")
+        await send_message_error(user, "Couldn't send message")
+        return
+    except Exception as e:
+        logger.exception(f"Error processing message of user {user.id}: {e}")
+        await send_message_error(user, "Couldn't send message")
+        return
+
+    frame = chat_ws_service.encode_message_frame(
+        db_message.id,
+        db_message.chat_id,
+        user.username,
+        db_message.content,
+        db_message.created_at,
+    )
+    await recent_messages_cache.push(
+        db_message.chat_id,
+        MessageInfoS(
+            id=db_message.id,
+            user_id=user.id,
+            username=user.username,
+            created_at=db_message.created_at,
+            content=db_message.content,
+        ),
+    )
+    try:
+        await chat_bus.publish(db_message.chat_id, frame)
+    except Exception as e:
+        logger.exception(f"Error redis publishing message: {e}")
+
+    await manager.send_json_to_user(
+        user.id,
+        {
+            "action": "message_response",
+            "status": "success",
+            "message_id": str(db_message.id),
+            "created_at": db_message.created_at.isoformat(),
+        },
+    )
+
+
+async def replay_chat_events(
+    websocket: WebSocket, user: UserSlimS, ws_message: WSSubscribe
 ):
+    """
+    Send events the client missed in chats it resumed and has access to.
+    """
+    if not ws_message.resume_from:
+        return
+    subscribed = manager.user_subscriptions.get(user.id, set())
+    for chat_id, last_id in ws_message.resume_from.items():
+        if chat_id not in subscribed:
+            continue
+        try:
+            replayed = await chat_bus.replay(websocket, chat_id, last_id)
+        except Exception as e:
+            logger.error(f"Couldn't replay chat {chat_id} from {last_id}: {e}")
+            continue
+        logger.info(f"Replayed {replayed} events of chat {chat_id} to {user.id}")
+
+
+async def authenticate_websocket(token: str) -> UserSlimS:
+    """
+    Resolve the connecting user with a session that is closed before the
+    socket is accepted, so open sockets hold no database connection.
+    """
     try:
-        payload = decode_jwt(token)
+        payload = decode_jwt_cached(token)
     except Exception:
         raise CredentialError
 
-    user = await AuthService.get_user_by_token(session, payload)
+    async with session_context() as session:
+        user = await AuthService.get_principal_by_token(session, payload)
+
+    if not user.is_active:
+        raise CredentialError(message="Account not activated")
+    return user
+
+
+@router.websocket("/ws")
+async def websocket_chat(
+    websocket: WebSocket,
+    token: str = Query(...),
+    batch: bool = Query(False),
+    heartbeat: bool = Query(False),
+):
+    user = await authenticate_websocket(token)
 
-    await manager.connect(user.id, websocket)
+    subprotocol = negotiate_protocol(websocket.scope.get("subprotocols", ()))
+    await manager.connect(
+        user.id,
+        websocket,
+        subprotocol=subprotocol,
+        batch=batch,
+        heartbeat=heartbeat,
+        handler=asyncio.current_task(),
+    )
+    if subprotocol == MSGPACK_PROTOCOL:
+        receive, protocol = websocket.receive_bytes, MSGPACK_PROTOCOL
+    else:
+        receive, protocol = websocket.receive_text, JSON_PROTOCOL
+    buckets = rate_limiter.connection_buckets()
     try:
         while True:
             try:
-                data = await websocket.receive_json()
-                parse_ws_message(data)
-                data["user_id"] = str(user.id)
-                await redis_publish("chat_channel", json.dumps(data))
+                raw = await receive()
+                manager.touch(websocket)
+                ws_message = parse_ws_message(raw, protocol)
+                if isinstance(ws_message, WSPong):
+                    continue
+                ws_message.user_id = user.id
+                retry_after = await rate_limiter.hit(
+                    user.id, ws_message.action, buckets
+                )
+                if retry_after:
+                    await manager.send_json_to_socket(
+                        websocket,
+                        {
+                            "action": "rate_limited",
+                            "status": "error",
+                            "error": "rate_limited",
+                            "limited_action": ws_message.action,
+                            "retry_after": round(retry_after, 3),
+                        },
+                    )
+                    continue
+                if isinstance(ws_message, WSSubscribe):
+                    # Subscriptions only concern this worker's sockets
+                    await chat_ws_service.handle_ws_message(ws_message)
+                    await replay_chat_events(websocket, user, ws_message)
+                else:
+                    await handle_chat_message(user, ws_message)
             except ValidationError as e:
                 logger.error(f"Websocket data validation error: {e}")
-                await websocket.send_json({"status": "error", "error": e.errors()})
+                await manager.send_json_to_socket(
+                    websocket, {"status": "error", "error": e.errors()}
+                )
             except ValueError as e:
                 logger.error(f"Websocket action error: {e}")
-                await websocket.send_json({"status": "error", "error": str(e)})
+                await manager.send_json_to_socket(
+                    websocket, {"status": "error", "error": str(e)}
+                )
+    except asyncio.CancelledError:
+        # Reaped sockets are already unregistered, anything else is a shutdown
+        if websocket in manager.outbound_queues:
+            raise
+        logger.info(f"Reaped socket of user {user.id} stopped receiving")
     except Exception as e:
         logger.error(f"Disconnected: {e}")
     finally:
         if websocket.client_state != WebSocketState.DISCONNECTED:
             try:
                 await websocket.close(code=1001)
-            except WebSocketDisconnect:
+            except (WebSocketDisconnect, RuntimeError):
+                # the reaper or an eviction may have closed it already
                 pass
         manager.disconnect(websocket, user.id)
@@ -1,17 +1,15 @@
-import json
 import logging
+from datetime import datetime
+from typing import Union
 from uuid import UUID
 
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import WebSocket
+from pydantic import ValidationError
 
-from app_ws.utils import parse_ws_message
-from shared.chat.services import ChatService
-from shared.database import session_context
-from shared.users.models import User
-from shared.users.services import UserService
-from shared.websocket.schemas import WSMessage, WSPushNotificationS, WSSubscribe
+from shared.chat.cache import chat_members_cache
+from shared.websocket.schemas import WSPushNotificationS, WSSubscribe
 
-from .ws_manager import ConnectionManager, manager
+from .ws_manager import ConnectionManager, encode_json, manager
 
 logger = logging.getLogger(__name__)
 
@@ -20,15 +18,15 @@ class ChatWSService:
     def __init__(self, manager: ConnectionManager):
         self.manager = manager
 
-    async def _handle_subscribe(
-        self, user: User, session: AsyncSession, data: WSSubscribe
-    ):
+    async def _handle_subscribe(self, data: WSSubscribe):
         chat_ids = data.chat_ids
-        chat_ids_to_subscribe = await ChatService.get_user_chat_ids_in_list(
-            session, user, chat_ids
-        )
+        chat_ids_to_subscribe = [
+            chat_id
+            for chat_id in chat_ids
+            if await chat_members_cache.is_member(chat_id, data.user_id)
+        ]
         for chat_id in chat_ids_to_subscribe:
-            self.manager.subscribe_to_chat(user.id, chat_id)
+            self.manager.subscribe_to_chat(data.user_id, chat_id)
 
         results = []
         for id in chat_ids:
@@ -40,88 +38,77 @@ class ChatWSService:
                 )
 
         await self.manager.send_json_to_user(
-            user.id, {"action": "subscribe_response", "results": results}
+            data.user_id, {"action": "subscribe_response", "results": results}
         )
 
-    async def _handle_message(self, user: User, session: AsyncSession, data: WSMessage):
-        is_sent = await self.manager.send_json_to_chat(
-            data.chat_id,
+    @staticmethod
+    def encode_message_frame(
+        message_id: UUID,
+        chat_id: UUID,
+        username: str,
+        text: str,
+        created_at: datetime,
+    ) -> str:
+        """
+        Encode the frame subscribers receive for a chat message. It is built
+        once at ingress and travels through the bus as is.
+        """
+        return encode_json(
             {
-                "from": user.username,
-                "message": f"{data.text}",
-                "chat_id": str(data.chat_id),
-            },
+                "id": str(message_id),
+                "from": username,
+                "message": text,
+                "chat_id": str(chat_id),
+                "created_at": created_at.isoformat(),
+            }
         )
-        response = {"action": "message_response"}
-        if is_sent:
-            await ChatService.create_message(session, data.chat_id, user.id, data.text)
-            response["status"] = "success"
-        else:
-            response["status"] = "error"
-            response["error"] = "Couldn't send message"
-        await self.manager.send_json_to_user(user.id, response)
-
-    async def _handle_push_notification(self, user: User, data: WSPushNotificationS):
+
+    @staticmethod
+    def with_stream_id(frame: str, stream_id: str) -> str:
+        # Stream ids are "<ms>-<seq>", so they can be spliced in without escaping
+        return f'{frame[:-1]},"stream_id":"{stream_id}"}}'
+
+    async def handle_chat_frame(self, chat_id: UUID, frame: str):
+        # Bus events are already persisted and authorized, fan out only
+        result = await self.manager.broadcast_text_to_chat(chat_id, frame)
+        logger.info(
+            f"Chat {chat_id} fan-out: delivered={result.delivered} "
+            f"failed={result.failed}"
+        )
+
+    async def send_chat_frame_to_socket(self, ws: WebSocket, frame: str):
+        await self.manager.send_text_to_socket(ws, frame)
+
+    async def _handle_push_notification(self, data: WSPushNotificationS):
         await self.manager.send_json_to_user(
-            user.id,
+            data.user_id,
             data.model_dump(mode="json"),
         )
 
-    @staticmethod
-    def safe_parse_message(payload: dict):
+    async def handle_data(self, data: Union[str, bytes]):
         try:
-            action = payload.get("action")
-            if action == "push_notification":
-                return WSPushNotificationS(**payload)
-            else:
-                return parse_ws_message(payload)
-        except ValueError as e:
+            ws_message = WSPushNotificationS.model_validate_json(data)
+        except ValidationError as e:
             logger.error(f"Invalid WS message format: {e}")
-            return None
-
-    async def handle_data(self, data: str):
-        try:
-            payload = json.loads(data)
-        except TypeError as e:
-            logger.error(f"Invalid JSON message: {e}")
-            return
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON message: {e}")
             return
 
-        ws_message = self.safe_parse_message(payload)
-
-        if not ws_message:
-            return
+        await self.handle_ws_message(ws_message)
 
+    async def handle_ws_message(
+        self, ws_message: Union[WSSubscribe, WSPushNotificationS]
+    ):
         try:
-            async with session_context() as session:
-                user = await UserService.get_user_by_id(session, ws_message.user_id)
-                if not user:
-                    logger.warning(f"User {ws_message.user_id} not found")
-                    return
-
-                if isinstance(ws_message, WSMessage):
-                    await self._handle_message(
-                        user,
-                        session,
-                        ws_message,
-                    )
-                elif isinstance(ws_message, WSSubscribe):
-                    await self._handle_subscribe(
-                        user,
-                        session,
-                        ws_message,
-                    )
-                elif isinstance(ws_message, WSPushNotificationS):
-                    await self._handle_push_notification(user, ws_message)
-                else:
-                    raise ValueError(f"Unknown WS message type: {type(ws_message)}")
+            if isinstance(ws_message, WSPushNotificationS):
+                await self._handle_push_notification(ws_message)
+            elif isinstance(ws_message, WSSubscribe):
+                await self._handle_subscribe(ws_message)
+            else:
+                raise ValueError(f"Unknown WS message type: {type(ws_message)}")
         except Exception as e:
             logger.exception(f"Error processing message: {e}")
             try:
                 await self.manager.send_json_to_user(
-                    UUID(ws_message.user_id),
+                    ws_message.user_id,
                     {
                         "status": "error",
                         "error": "Message processing failed",
@@ -1,11 +1,28 @@
-from shared.websocket.schemas import WSMessage, WSSubscribe
+from typing import Union
 
+from pydantic import ValidationError
 
-def parse_ws_message(data: dict):
-    action = data.get("action")
-    if action == "subscribe":
-        return WSSubscribe(**data)
-    elif action == "message":
-        return WSMessage(**data)
-    else:
-        raise ValueError(f"Unknown action: {action}")
+from shared.websocket.schemas import (
+    WSMessage,
+    WSPong,
+    WSSubscribe,
+    ws_client_message_adapter,
+)
+
+from .protocols import JSON_PROTOCOL, MSGPACK_PROTOCOL, unpack
+
+
+def parse_ws_message(
+    raw: Union[str, bytes], protocol: str = JSON_PROTOCOL
+) -> Union[WSSubscribe, WSMessage, WSPong]:
+    try:
+        if protocol == MSGPACK_PROTOCOL:
+            return ws_client_message_adapter.validate_python(unpack(raw))
+        return ws_client_message_adapter.validate_json(raw)
+    except ValidationError as e:
+        error = e.errors()[0]
+        if error["type"] == "union_tag_invalid":
+            raise ValueError(f"Unknown action: {error['ctx']['tag']}")
+        if error["type"] == "union_tag_not_found":
+            raise ValueError("Unknown action: None")
+        raise
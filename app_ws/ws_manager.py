@@ -1,21 +1,149 @@
 import asyncio
 import logging
-from typing import Dict, Set
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from uuid import UUID
 
 from fastapi import WebSocket
 from fastapi.websockets import WebSocketState
 
+from shared.core.serialization import dumps_str
+from shared.settings import settings
+
+from .protocols import JSON_PROTOCOL, Frame, batch_frames
+
 logger = logging.getLogger(__name__)
 
 
+def encode_json(data: dict) -> str:
+    # Same output as WebSocket.send_json, encoded by orjson
+    return dumps_str(data)
+
+
+def percentile(values: Iterable[float], percent: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+    return ordered[index]
+
+
+# A queued frame, when it was queued and the chat it was broadcast to
+QueuedFrame = Tuple[Union[str, bytes], float, Optional[UUID]]
+
+
+@dataclass
+class BroadcastResult:
+    delivered: int = 0
+    failed: int = 0
+
+
+class OutboundQueue:
+    """
+    Bounded queue of outgoing frames for a single socket, drained by its own
+    writer task so producers never wait on the network.
+    """
+
+    def __init__(
+        self,
+        user_id: UUID,
+        ws: WebSocket,
+        maxsize: int,
+        protocol: str = JSON_PROTOCOL,
+        batch: bool = False,
+        heartbeat: bool = False,
+    ):
+        self.user_id = user_id
+        self.ws = ws
+        self.protocol = protocol
+        self.batch = batch
+        self.heartbeat = heartbeat
+        self.frames: asyncio.Queue[QueuedFrame] = asyncio.Queue(maxsize)
+        self.writer: Optional[asyncio.Task] = None
+        # The task reading from the socket, cancelled when the socket is reaped
+        self.handler: Optional[asyncio.Task] = None
+        self.last_seen = time.monotonic()
+        self.last_ping = 0.0
+
+    def queued_bytes(self) -> int:
+        return sum(sys.getsizeof(frame) for frame, _, _ in self.frames._queue)
+
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(
+        self,
+        queue_high_water: int = settings.ws.OUTBOUND_QUEUE_HIGH_WATER,
+        slow_consumer_policy: str = settings.ws.SLOW_CONSUMER_POLICY,
+        send_timeout: float = settings.ws.SEND_TIMEOUT_SECONDS,
+        batch_max_delay_ms: float = settings.ws.BATCH_MAX_DELAY_MS,
+        batch_max_size: int = settings.ws.BATCH_MAX_SIZE,
+        ping_interval: float = settings.ws.PING_INTERVAL_SECONDS,
+        idle_timeout: float = settings.ws.IDLE_TIMEOUT_SECONDS,
+        reap_interval: float = settings.ws.REAP_INTERVAL_SECONDS,
+    ):
+        self.queue_high_water = queue_high_water
+        self.slow_consumer_policy = slow_consumer_policy
+        self.send_timeout = send_timeout
+        self.batch_max_delay = batch_max_delay_ms / 1000
+        self.batch_max_size = batch_max_size
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
         self.active_connections: Dict[UUID, Set[WebSocket]] = {}
         self.chat_subscriptions: Dict[UUID, Set[UUID]] = {}
+        # Reverse index of chat_subscriptions: user_id -> chat_ids
+        self.user_subscriptions: Dict[UUID, Set[UUID]] = {}
+        self.outbound_queues: Dict[WebSocket, OutboundQueue] = {}
+        self.dropped_frames = 0
+        self.evicted_connections = 0
+        self.batches_sent = 0
+        self.batched_events = 0
+        self.pings_sent = 0
+        self.reaped_connections = 0
+        self.reclaimed_frames = 0
+        self.reclaimed_bytes = 0
+        self.send_latencies: Deque[float] = deque(maxlen=1024)
+        # Delivery latencies of broadcasts per chat with local subscribers
+        self.chat_latencies: Dict[UUID, Deque[float]] = {}
+        self._close_tasks: Set[asyncio.Task] = set()
+        # Called when a chat gets its first local subscriber / loses its last one
+        self.on_chat_added: Optional[Callable[[UUID], None]] = None
+        self.on_chat_removed: Optional[Callable[[UUID], None]] = None
 
-    async def connect(self, user_id: UUID, websocket: WebSocket):
-        await websocket.accept()
+    async def connect(
+        self,
+        user_id: UUID,
+        websocket: WebSocket,
+        subprotocol: Optional[str] = None,
+        batch: bool = False,
+        heartbeat: bool = False,
+        handler: Optional[asyncio.Task] = None,
+    ):
+        await websocket.accept(subprotocol=subprotocol)
+        outbound = OutboundQueue(
+            user_id,
+            websocket,
+            self.queue_high_water,
+            protocol=subprotocol or JSON_PROTOCOL,
+            batch=batch,
+            heartbeat=heartbeat,
+        )
+        outbound.writer = asyncio.create_task(self._writer(outbound))
+        outbound.handler = handler
+        self.outbound_queues[websocket] = outbound
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
         self.active_connections[user_id].add(websocket)
@@ -23,7 +151,19 @@ class ConnectionManager:
             f"User {user_id} connected. Total connections: {len(self.active_connections[user_id])}"
         )
 
+    def touch(self, ws: WebSocket):
+        """
+        Record inbound traffic on the socket, which proves it is alive.
+        """
+        outbound = self.outbound_queues.get(ws)
+        if outbound is not None:
+            outbound.last_seen = time.monotonic()
+
     def disconnect(self, ws: WebSocket, user_id: UUID):
+        outbound = self.outbound_queues.pop(ws, None)
+        if outbound is not None:
+            outbound.writer.cancel()
+
         if user_id not in self.active_connections:
             return
 
@@ -37,45 +177,272 @@ class ConnectionManager:
 
         if not connections:
             self.active_connections.pop(user_id, None)
-            for chat_id in list(self.chat_subscriptions.keys()):
-                if user_id in self.chat_subscriptions[chat_id]:
-                    self.chat_subscriptions[chat_id].remove(user_id)
-                    logger.info(f"User {user_id} unsubscribed from chat {chat_id}")
-                if not self.chat_subscriptions[chat_id]:
-                    self.chat_subscriptions.pop(chat_id)
-                    logger.info(
-                        f"No subscribers left for chat {chat_id}. Chat removed."
-                    )
+            for chat_id in self.user_subscriptions.pop(user_id, set()):
+                self._remove_chat_subscriber(chat_id, user_id)
 
     def subscribe_to_chat(self, user_id: UUID, chat_id: UUID):
         if chat_id not in self.chat_subscriptions:
             self.chat_subscriptions[chat_id] = set()
+            if self.on_chat_added:
+                self.on_chat_added(chat_id)
         self.chat_subscriptions[chat_id].add(user_id)
+        if user_id not in self.user_subscriptions:
+            self.user_subscriptions[user_id] = set()
+        self.user_subscriptions[user_id].add(chat_id)
         logger.info(f"User {user_id} subscribed to chat {chat_id}")
 
+    def unsubscribe_from_chat(self, user_id: UUID, chat_id: UUID):
+        user_chats = self.user_subscriptions.get(user_id)
+        if not user_chats or chat_id not in user_chats:
+            return
+        user_chats.remove(chat_id)
+        if not user_chats:
+            self.user_subscriptions.pop(user_id)
+        self._remove_chat_subscriber(chat_id, user_id)
+
+    def _remove_chat_subscriber(self, chat_id: UUID, user_id: UUID):
+        subscribers = self.chat_subscriptions.get(chat_id)
+        if subscribers is None:
+            return
+        subscribers.discard(user_id)
+        logger.info(f"User {user_id} unsubscribed from chat {chat_id}")
+        if not subscribers:
+            self.chat_subscriptions.pop(chat_id)
+            self.chat_latencies.pop(chat_id, None)
+            logger.info(f"No subscribers left for chat {chat_id}. Chat removed.")
+            if self.on_chat_removed:
+                self.on_chat_removed(chat_id)
+
     async def send_json_to_user(self, user_id: UUID, data: dict):
+        self._send_to_user(user_id, Frame(data=data))
+
+    async def send_text_to_user(self, user_id: UUID, frame: str):
+        self._send_to_user(user_id, Frame(text=frame))
+
+    def _send_to_user(self, user_id: UUID, frame: Frame):
         if user_id not in self.active_connections:
             logger.warning(f"Tried to send data to disconnected user {user_id}")
             return
-        websockets = self.active_connections[user_id]
-        await asyncio.gather(*(self._safe_send_json(ws, data) for ws in websockets))
+        for ws in list(self.active_connections[user_id]):
+            self._enqueue(ws, frame)
 
-    async def _safe_send_json(self, ws: WebSocket, data: dict):
-        try:
-            if ws.client_state == WebSocketState.CONNECTED:
-                await ws.send_json(data)
-        except Exception as e:
-            logger.error(f"Error sending JSON: {e}")
+    async def send_json_to_socket(self, ws: WebSocket, data: dict):
+        self._enqueue(ws, Frame(data=data))
+
+    async def send_text_to_socket(self, ws: WebSocket, frame: str):
+        self._enqueue(ws, Frame(text=frame))
 
-    async def send_json_to_chat(self, chat_id: UUID, data: dict) -> bool:
+    async def broadcast_json_to_chat(
+        self, chat_id: UUID, data: dict
+    ) -> BroadcastResult:
+        """
+        Queue data for every subscriber socket of the chat, encoding the frame
+        only once per protocol. Never waits on a socket.
+        """
+        return await self._broadcast(chat_id, Frame(data=data))
+
+    async def broadcast_text_to_chat(
+        self, chat_id: UUID, frame: str
+    ) -> BroadcastResult:
+        """
+        Queue an already JSON encoded frame for every subscriber socket of the
+        chat, other protocols get it re-encoded once.
+        """
+        return await self._broadcast(chat_id, Frame(text=frame))
+
+    async def _broadcast(self, chat_id: UUID, frame: Frame) -> BroadcastResult:
+        result = BroadcastResult()
         if chat_id not in self.chat_subscriptions:
             logger.warning(f"Chat {chat_id} has no subscribers")
+            return result
+
+        websockets = [
+            ws
+            for user_id in self.chat_subscriptions[chat_id]
+            for ws in self.active_connections.get(user_id, ())
+        ]
+        for ws in websockets:
+            if self._enqueue(ws, frame, chat_id):
+                result.delivered += 1
+            else:
+                result.failed += 1
+
+        return result
+
+    async def wait_for_room(self, ws: WebSocket, room: int) -> bool:
+        """
+        Wait until the socket's queue can take `room` more frames without
+        reaching the high-water mark. False once the socket is gone, which a
+        stalled writer ends in through its send timeout.
+        """
+        while True:
+            outbound = self.outbound_queues.get(ws)
+            if outbound is None:
+                return False
+            if self.queue_high_water - outbound.frames.qsize() >= room:
+                return True
+            await asyncio.sleep(0.005)
+
+    def _enqueue(
+        self, ws: WebSocket, frame: Frame, chat_id: Optional[UUID] = None
+    ) -> bool:
+        outbound = self.outbound_queues.get(ws)
+        if outbound is None:
             return False
+        frame = frame.encode(outbound.protocol)
+
+        try:
+            outbound.frames.put_nowait((frame, time.perf_counter(), chat_id))
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_consumer_policy == "drop":
+            # Keep the newest frames, the oldest are the most stale
+            outbound.frames.get_nowait()
+            outbound.frames.put_nowait((frame, time.perf_counter(), chat_id))
+            self.dropped_frames += 1
+            return True
+
+        self._evict(outbound, f"outbound queue reached {self.queue_high_water}")
+        return False
+
+    async def _writer(self, outbound: OutboundQueue):
+        ws = outbound.ws
+        while True:
+            entries = [await outbound.frames.get()]
+            frame = entries[0][0]
+            if outbound.batch:
+                frame = await self._coalesce(outbound, entries)
+            if ws.client_state != WebSocketState.CONNECTED:
+                continue
+            try:
+                send = ws.send_bytes if isinstance(frame, bytes) else ws.send_text
+                await asyncio.wait_for(send(frame), timeout=self.send_timeout)
+            except asyncio.TimeoutError:
+                self._evict(outbound, f"send timed out after {self.send_timeout}s")
+                return
+            except Exception as e:
+                logger.error(f"Error sending JSON: {e}")
+                continue
+            self._record_latencies(entries)
+
+    def _record_latencies(self, entries: List[QueuedFrame]):
+        sent_at = time.perf_counter()
+        for _, queued_at, chat_id in entries:
+            latency = sent_at - queued_at
+            self.send_latencies.append(latency)
+            if chat_id is None or chat_id not in self.chat_subscriptions:
+                continue
+            if chat_id not in self.chat_latencies:
+                self.chat_latencies[chat_id] = deque(maxlen=256)
+            self.chat_latencies[chat_id].append(latency)
+
+    async def _coalesce(
+        self, outbound: OutboundQueue, entries: List[QueuedFrame]
+    ) -> Union[str, bytes]:
+        """
+        Wait up to the batch window for more frames and send them as one.
+        The frames taken are appended to `entries`.
+        """
+        if outbound.frames.qsize() + 1 < self.batch_max_size:
+            await asyncio.sleep(self.batch_max_delay)
+        while len(entries) < self.batch_max_size and not outbound.frames.empty():
+            entries.append(outbound.frames.get_nowait())
+        if len(entries) == 1:
+            return entries[0][0]
+        self.batches_sent += 1
+        self.batched_events += len(entries)
+        return batch_frames([frame for frame, _, _ in entries], outbound.protocol)
+
+    def _evict(self, outbound: OutboundQueue, reason: str):
+        logger.warning(f"Evicting slow consumer of user {outbound.user_id}: {reason}")
+        self.evicted_connections += 1
+        self._drop_connection(outbound, code=1013)
+
+    def _drop_connection(self, outbound: OutboundQueue, code: int):
+        self.disconnect(outbound.ws, outbound.user_id)
+        task = asyncio.create_task(self._close(outbound.ws, code))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def _close(self, ws: WebSocket, code: int):
+        try:
+            if ws.client_state == WebSocketState.CONNECTED:
+                # A half-open socket may never take the close frame
+                await asyncio.wait_for(ws.close(code=code), timeout=self.send_timeout)
+        except Exception as e:
+            logger.error(f"Error closing socket: {e}")
+
+    def reap(self) -> int:
+        """
+        Close and unregister sockets that are already disconnected. Sockets
+        that opted into the heartbeat are also pinged when silent for
+        ping_interval and reaped when silent for idle_timeout; the others
+        are left to the server's protocol-level pings.
+        Returns the number of reaped sockets.
+        """
+        now = time.monotonic()
+        reaped = 0
+        for outbound in list(self.outbound_queues.values()):
+            idle = now - outbound.last_seen
+            dead = outbound.ws.client_state == WebSocketState.DISCONNECTED
+            timed_out = outbound.heartbeat and idle >= self.idle_timeout
+            if dead or timed_out:
+                logger.info(
+                    f"Reaping socket of user {outbound.user_id}, idle {idle:.0f}s"
+                )
+                self.reaped_connections += 1
+                self.reclaimed_frames += outbound.frames.qsize()
+                self.reclaimed_bytes += outbound.queued_bytes()
+                self._drop_connection(outbound, code=1001)
+                # The handler may be stuck in receive() on a half-open socket
+                if outbound.handler is not None:
+                    outbound.handler.cancel()
+                reaped += 1
+            elif (
+                outbound.heartbeat
+                and idle >= self.ping_interval
+                and now - outbound.last_ping >= self.ping_interval
+            ):
+                outbound.last_ping = now
+                self.pings_sent += 1
+                self._enqueue(outbound.ws, Frame(data={"action": "ping"}))
+        return reaped
 
-        for user_id in self.chat_subscriptions[chat_id]:
-            await self.send_json_to_user(user_id, data)
+    async def run_reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.exception(f"Reaper failed: {e}")
 
-        return True
+    def outbound_stats(self) -> dict:
+        depths = [outbound.frames.qsize() for outbound in self.outbound_queues.values()]
+        return {
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_frames": self.dropped_frames,
+            "evicted_connections": self.evicted_connections,
+            "batches_sent": self.batches_sent,
+            "batched_events": self.batched_events,
+            "pings_sent": self.pings_sent,
+            "reaped_connections": self.reaped_connections,
+            "reclaimed_frames": self.reclaimed_frames,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "send_latency_p50": percentile(self.send_latencies, 50),
+            "send_latency_p95": percentile(self.send_latencies, 95),
+            "send_latency_p99": percentile(self.send_latencies, 99),
+            "chat_send_latency": {
+                str(chat_id): {
+                    "p50": percentile(latencies, 50),
+                    "p99": percentile(latencies, 99),
+                }
+                for chat_id, latencies in self.chat_latencies.items()
+            },
+        }
 
 
 manager = ConnectionManager()
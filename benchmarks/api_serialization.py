@@ -0,0 +1,74 @@
+"""
+Response encoding cost of the message-history and chat-list endpoints:
+stdlib JSONResponse against the orjson-based FastJSONResponse.
+
+    python -m benchmarks.api_serialization
+"""
+
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from shared.chat.models import ChatType  # noqa: E402
+from shared.chat.schemas import ChatS, MessageInfoS  # noqa: E402
+from shared.core.serialization import FastJSONResponse  # noqa: E402
+
+ROUNDS = 200
+
+now = datetime.now(timezone.utc)
+history = {
+    "messages": [
+        MessageInfoS(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            username=f"user{i % 20}",
+            created_at=now,
+            content="Привет! How is it going?" * 3,
+        )
+        for i in range(1_000)
+    ]
+}
+chat_list = [
+    ChatS(
+        id=uuid.uuid4(),
+        name=f"chat {i}",
+        description=None,
+        type=ChatType.GROUP,
+        created_at=now,
+        updated_at=now,
+    )
+    for i in range(200)
+]
+
+
+def measure(render: Callable[[Any], bytes], content: Any) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        render(content)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    renderers = {
+        "jsonable_encoder + json": lambda c: JSONResponse(jsonable_encoder(c)).body,
+        "jsonable_encoder + orjson": lambda c: (
+            FastJSONResponse(jsonable_encoder(c)).body
+        ),
+        "orjson only": lambda c: FastJSONResponse(c).body,
+    }
+    for endpoint, content in (("history", history), ("chat list", chat_list)):
+        print(endpoint)
+        for name, render in renderers.items():
+            print(f"  {name:<28}{measure(render, content) * 1e3:8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
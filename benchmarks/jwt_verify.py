@@ -0,0 +1,39 @@
+"""
+Compare per-request cost of full RS256 verification against the verified
+token cache.
+
+    python -m benchmarks.jwt_verify
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from shared.auth.utils import (  # noqa: E402
+    create_access_token,
+    decode_jwt,
+    decode_jwt_cached,
+)
+
+ROUNDS = 20_000
+
+
+def run(decode, token: str) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decode(token)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    token = create_access_token({"sub": "benchmark"})
+    full = run(decode_jwt, token)
+    cached = run(decode_jwt_cached, token)
+    print(f"decode_jwt:        {full * 1e6:8.1f}us/op")
+    print(f"decode_jwt_cached: {cached * 1e6:8.1f}us/op ({full / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
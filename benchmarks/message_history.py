@@ -0,0 +1,135 @@
+"""
+Latency of a message-history page near the newest messages and 10,000 pages
+deep, keyset cursor against OFFSET. Seeds a throwaway chat and removes it.
+
+Requires a migrated Postgres at DB__URL:
+    python -m benchmarks.message_history
+"""
+
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import select, text  # noqa: E402
+
+from shared.chat.models import Chat, ChatType, Message  # noqa: E402
+from shared.chat.services import ChatService  # noqa: E402
+from shared.chat.utils import encode_cursor  # noqa: E402
+from shared.database import engine, session_context  # noqa: E402
+from shared.users.models import User  # noqa: E402
+
+PAGE_SIZE = 50
+DEEP_PAGE = 10_000
+MESSAGES = PAGE_SIZE * (DEEP_PAGE + 10)
+ROUNDS = 20
+
+
+async def seed():
+    suffix = uuid.uuid4().hex[:8]
+    async with session_context() as session:
+        user = User(
+            username=f"bench_{suffix}",
+            email=f"bench_{suffix}@example.com",
+            password="-",
+            is_active=True,
+        )
+        chat = Chat(name=f"bench {suffix}", type=ChatType.GROUP)
+        session.add_all([user, chat])
+        await session.commit()
+        await session.execute(
+            text(
+                "INSERT INTO messages (id, chat_id, user_id, content, created_at) "
+                "SELECT gen_random_uuid(), :chat_id, :user_id, 'message ' || i, "
+                "now() - make_interval(secs => i) "
+                "FROM generate_series(1, :total) AS i"
+            ),
+            {"chat_id": chat.id, "user_id": user.id, "total": MESSAGES},
+        )
+        await session.commit()
+        await session.execute(text("ANALYZE messages"))
+        return user, chat
+
+
+async def deep_cursor(chat_id: uuid.UUID) -> str:
+    async with session_context() as session:
+        result = await session.execute(
+            select(Message.created_at, Message.id)
+            .where(Message.chat_id == chat_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .offset(PAGE_SIZE * DEEP_PAGE - 1)
+            .limit(1)
+        )
+        created_at, message_id = result.one()
+        return encode_cursor(created_at, message_id)
+
+
+async def timed(query) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        async with session_context() as session:
+            start = time.perf_counter()
+            await query(session)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def offset_page(chat_id: uuid.UUID, page: int):
+    async def query(session):
+        result = await session.execute(
+            select(Message, User.username)
+            .join(User)
+            .where(Message.chat_id == chat_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .offset(PAGE_SIZE * page)
+            .limit(PAGE_SIZE)
+        )
+        return result.all()
+
+    return query
+
+
+def keyset_page(chat_id: uuid.UUID, cursor):
+    async def query(session):
+        return await ChatService.get_messages_by_chat(
+            session, chat_id, PAGE_SIZE, before=cursor
+        )
+
+    return query
+
+
+async def main():
+    print(f"seeding {MESSAGES} messages...")
+    user, chat = await seed()
+    try:
+        cursor = await deep_cursor(chat.id)
+        rows = {
+            "keyset": (
+                await timed(keyset_page(chat.id, None)),
+                await timed(keyset_page(chat.id, cursor)),
+            ),
+            "offset": (
+                await timed(offset_page(chat.id, 0)),
+                await timed(offset_page(chat.id, DEEP_PAGE)),
+            ),
+        }
+        print(f"{'':<8}{'page 1':>12}{f'page {DEEP_PAGE}':>14}")
+        for name, (first, deep) in rows.items():
+            print(f"{name:<8}{first * 1e3:>10.2f}ms{deep * 1e3:>12.2f}ms")
+    finally:
+        async with session_context() as session:
+            await session.execute(
+                text("DELETE FROM chats WHERE id = :id"), {"id": chat.id}
+            )
+            await session.execute(
+                text("DELETE FROM users WHERE id = :id"), {"id": user.id}
+            )
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Compare chat publish throughput of a new Redis client per message against the
+pooled, pipelined RedisManager.
+
+Requires a running Redis at REDIS__URL:
+    python -m benchmarks.redis_publish
+"""
+
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import aioredis  # noqa: E402
+
+from shared.redis import RedisManager  # noqa: E402
+from shared.settings import settings  # noqa: E402
+
+MESSAGES = 20_000
+CONCURRENCY = 200
+CHANNEL = "benchmark_channel"
+
+payload = json.dumps(
+    {
+        "action": "message",
+        "chat_id": "c3f2571c-e7ae-4564-bb7a-f7ec216ae2b9",
+        "text": "hello",
+        "user_id": "4ea7c3fd-6ec3-4b1e-9a57-0a6c2b6c8a10",
+    }
+)
+
+
+async def publish_new_client():
+    redis = aioredis.from_url(settings.redis.URL, decode_responses=True)
+    await redis.publish(CHANNEL, payload)
+
+
+async def run(publish, messages: int) -> float:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            await publish()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(messages)))
+    return messages / (time.perf_counter() - start)
+
+
+async def main():
+    # The old path leaks a pool per message, keep it short
+    before = await run(publish_new_client, MESSAGES // 10)
+
+    redis_manager = RedisManager(settings.redis.URL)
+    await redis_manager.connect()
+    after = await run(lambda: redis_manager.publish(CHANNEL, payload), MESSAGES)
+    await redis_manager.close()
+
+    print(f"client per publish: {before:10.0f} msg/s")
+    print(f"pooled + pipelined: {after:10.0f} msg/s ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
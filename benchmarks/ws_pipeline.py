@@ -0,0 +1,132 @@
+"""
+Per-stage CPU cost of a chat message from socket to fan-out: the previous
+pipeline (dict parse, re-serialize, re-parse and re-validate on the bus side)
+against the single-parse one.
+
+    python -m benchmarks.ws_pipeline
+"""
+
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app_ws.services import ChatWSService  # noqa: E402
+from app_ws.utils import parse_ws_message  # noqa: E402
+from app_ws.ws_manager import encode_json  # noqa: E402
+from shared.websocket.schemas import WSMessage  # noqa: E402
+
+ROUNDS = 50_000
+
+chat_id = uuid.uuid4()
+message_id = uuid.uuid4()
+created_at = datetime.now(timezone.utc)
+raw = json.dumps({"action": "message", "chat_id": str(chat_id), "text": "hello"})
+event = {
+    "action": "chat_message",
+    "id": str(message_id),
+    "chat_id": str(chat_id),
+    "username": "alice",
+    "text": "hello",
+    "created_at": created_at.isoformat(),
+}
+
+
+def old_ingress():
+    data = json.loads(raw)
+    data["user_id"] = str(message_id)
+    return WSMessage(**data)
+
+
+def old_bus_encode():
+    return json.dumps(
+        {
+            "action": "chat_message",
+            "id": str(message_id),
+            "chat_id": str(chat_id),
+            "username": "alice",
+            "text": "hello",
+            "created_at": created_at.isoformat(),
+        }
+    )
+
+
+def old_bus_decode():
+    payload = json.loads(old_bus_data)
+    payload["stream_id"] = "1724606194032-0"
+    return payload
+
+
+def old_frame():
+    return encode_json(
+        {
+            "id": event["id"],
+            "from": event["username"],
+            "message": event["text"],
+            "chat_id": event["chat_id"],
+            "created_at": event["created_at"],
+            "stream_id": "1724606194032-0",
+        }
+    )
+
+
+def new_ingress():
+    return parse_ws_message(raw)
+
+
+def new_bus_encode():
+    return ChatWSService.encode_message_frame(
+        message_id, chat_id, "alice", "hello", created_at
+    )
+
+
+def new_bus_decode():
+    return ChatWSService.with_stream_id(new_bus_data, "1724606194032-0")
+
+
+old_bus_data = old_bus_encode()
+new_bus_data = new_bus_encode()
+
+
+def measure(stages: Dict[str, Callable]) -> Dict[str, float]:
+    results = {}
+    for name, stage in stages.items():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            stage()
+        results[name] = (time.perf_counter() - start) / ROUNDS
+    return results
+
+
+def main():
+    old = measure(
+        {
+            "ingress parse": old_ingress,
+            "bus encode": old_bus_encode,
+            "bus decode": old_bus_decode,
+            "frame encode": old_frame,
+        }
+    )
+    new = measure(
+        {
+            "ingress parse": new_ingress,
+            "bus encode": new_bus_encode,
+            "bus decode": new_bus_decode,
+            "frame encode": lambda: None,
+        }
+    )
+    print(f"{'stage':<15}{'old us':>10}{'new us':>10}")
+    for stage in old:
+        print(f"{stage:<15}{old[stage] * 1e6:>10.2f}{new[stage] * 1e6:>10.2f}")
+    print(
+        f"{'total':<15}{sum(old.values()) * 1e6:>10.2f}{sum(new.values()) * 1e6:>10.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from shared.settings import settings
+
+
+def token_digest(token: str | bytes) -> bytes:
+    if isinstance(token, str):
+        token = token.encode()
+    return hashlib.sha256(token).digest()
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of claims of tokens whose signature was already verified, kept
+    until the token expires. Revocation is not its concern: tokens carry the
+    user's token version, which is checked after decoding.
+    """
+
+    def __init__(self, max_size: int = settings.cache.JWT_MAX_SIZE):
+        self.max_size = max_size
+        self._claims: OrderedDict[bytes, Tuple[dict, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str | bytes) -> Optional[dict]:
+        digest = token_digest(token)
+        entry = self._claims.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            self._claims.pop(digest)
+            self.misses += 1
+            return None
+        self._claims.move_to_end(digest)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str | bytes, claims: dict):
+        expires_at = claims.get("exp")
+        if expires_at is None:
+            return
+        self._claims[token_digest(token)] = (claims, float(expires_at))
+        while len(self._claims) > self.max_size:
+            self._claims.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+verified_token_cache = VerifiedTokenCache()
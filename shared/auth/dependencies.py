@@ -4,10 +4,11 @@ from fastapi import Depends, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from shared.auth.services import AuthService
-from shared.auth.utils import TokenType, decode_jwt
+from shared.auth.utils import TokenType, decode_jwt_cached
 from shared.database import SessionDep
 from shared.error.custom_exceptions import AuthorizationError, CredentialError
 from shared.users.models import User
+from shared.users.schemas import UserSlimS
 
 http_bearer = HTTPBearer(auto_error=False)
 
@@ -22,7 +23,7 @@ def get_current_token_payload(
         raise CredentialError
     try:
         token = credential.credentials
-        payload = decode_jwt(token)
+        payload = decode_jwt_cached(token)
     except Exception:
         raise CredentialError
     return payload
@@ -31,9 +32,28 @@ def get_current_token_payload(
 async def get_current_user(
     session: SessionDep,
     payload: dict = Depends(get_current_token_payload),
+) -> UserSlimS:
+    """
+    Retrieve the current user as a slim principal, without a database query
+    when the token carries principal claims.
+    """
+    try:
+        user = await AuthService.get_principal_by_token(session, payload)
+    except Exception:
+        raise CredentialError
+
+    if not user.is_active:
+        raise CredentialError(message="Account not activated")
+
+    return user
+
+
+async def get_current_db_user(
+    session: SessionDep,
+    payload: dict = Depends(get_current_token_payload),
 ) -> User:
     """
-    Retrieve the current user based on the provided HTTP authorization credentials.
+    Retrieve the current user model for endpoints that need more than the principal.
     """
     try:
         user = await AuthService.get_user_by_token(session, payload)
@@ -57,7 +77,7 @@ async def get_current_user_by_refresh(session: SessionDep, request: Request) ->
     if not refresh_token:
         raise CredentialError
     try:
-        payload = decode_jwt(refresh_token)
+        payload = decode_jwt_cached(refresh_token)
     except Exception:
         raise CredentialError
 
@@ -72,8 +92,8 @@ async def get_current_user_by_refresh(session: SessionDep, request: Request) ->
 
 
 async def get_current_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: UserSlimS = Depends(get_current_user),
+) -> UserSlimS:
     """
     Ensure the current user is a superuser.
     """
@@ -82,7 +102,8 @@ async def get_current_superuser(
     return current_user
 
 
-GetCurrentUserDep = Annotated[User, Depends(get_current_user)]
+GetCurrentUserDep = Annotated[UserSlimS, Depends(get_current_user)]
+GetCurrentDBUserDep = Annotated[User, Depends(get_current_db_user)]
 GetCurrentUserByRefreshDep = Annotated[User, Depends(get_current_user_by_refresh)]
 
-GetCurrentSuperUserDep = Annotated[User, Depends(get_current_superuser)]
+GetCurrentSuperUserDep = Annotated[UserSlimS, Depends(get_current_superuser)]
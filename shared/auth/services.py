@@ -14,6 +14,7 @@ from shared.auth.utils import (
     TokenType,
     generate_verification_token,
     hash_token,
+    principal_from_claims,
 )
 from shared.core.utils import hash_password, verify_password
 from shared.error.custom_exceptions import (
@@ -23,11 +24,20 @@ from shared.error.custom_exceptions import (
     ValidationError,
 )
 from shared.settings import settings
+from shared.users.cache import user_cache
 from shared.users.models import User
-from shared.users.schemas import UserBaseS
+from shared.users.schemas import UserBaseS, UserSlimS
 from shared.users.services import UserService
 
 
+def check_token_version(payload: dict, token_version: int):
+    """
+    Reject tokens issued before the user's last password change or update.
+    """
+    if payload.get("ver", 0) != token_version:
+        raise CredentialError(message="Token is outdated")
+
+
 class AuthService:
     @staticmethod
     async def authenticate_user(session: AsyncSession, user: UserAuthenticateS) -> User:
@@ -36,7 +46,7 @@ class AuthService:
             raise CredentialError(message="Username or Password incorrect")
         if not db_user.is_active:
             raise CredentialError(message="Account not activated")
-        return user
+        return db_user
 
     @classmethod
     async def get_user_by_token(
@@ -55,9 +65,34 @@ class AuthService:
         token_data = UserBaseS(username=username)
 
         user = await UserService.get_user_by_username(session, token_data.username)
+        check_token_version(payload, user.token_version)
 
         return user
 
+    @staticmethod
+    async def get_principal_by_token(session: AsyncSession, payload: dict) -> UserSlimS:
+        """
+        Resolve an access token to a slim user. With principal claims the
+        user is built from the token, which is only checked against the
+        user's current token version; every change to the user bumps it.
+        Tokens without claims fall back to the cached username lookup.
+        """
+        if payload.get(TOKEN_TYPE_FIELD) != TokenType.ACCESS.value:
+            raise CredentialError
+
+        principal = principal_from_claims(payload)
+        if principal is None:
+            username = payload.get("sub")
+            if username is None:
+                raise CredentialError
+            user = await UserService.get_slim_user_by_username(session, username)
+            check_token_version(payload, user.token_version)
+            return user
+
+        token_version = await UserService.get_token_version(session, principal.id)
+        check_token_version(payload, token_version)
+        return principal
+
     async def change_user_password(
         session: AsyncSession, user: User, current_password: str, new_password: str
     ) -> User:
@@ -71,9 +106,11 @@ class AuthService:
 
         new_hashed_password = hash_password(new_password)
         user.password = new_hashed_password
+        user.token_version += 1
 
         await session.commit()
         await session.refresh(user)
+        await user_cache.invalidate(user.id)
 
         return User
 
@@ -2,11 +2,13 @@ import hashlib
 import secrets
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Tuple
+from typing import Optional, Tuple
 
 import jwt
 
+from shared.auth.cache import verified_token_cache
 from shared.settings import settings
+from shared.users.schemas import UserSlimS
 
 TOKEN_TYPE_FIELD = "type"
 
@@ -42,6 +44,18 @@ def decode_jwt(
     return decoded
 
 
+def decode_jwt_cached(token: str | bytes) -> dict:
+    """
+    decode_jwt that skips signature verification for tokens already verified
+    by this process and not yet expired.
+    """
+    claims = verified_token_cache.get(token)
+    if claims is None:
+        claims = decode_jwt(token)
+        verified_token_cache.set(token, claims)
+    return claims
+
+
 def create_jwt(
     token_type: TokenType,
     payload: dict,
@@ -66,6 +80,36 @@ def create_access_token(payload: dict) -> str:
     )
 
 
+def create_principal_claims(user) -> dict:
+    """
+    Access token claims for a user. The token version revokes the token once
+    the user changes. In principal mode the token also carries what is
+    needed to authorize a request without loading the user.
+    """
+    claims = {"sub": user.username, "ver": user.token_version}
+    if settings.jwt.PRINCIPAL_CLAIMS:
+        claims.update(
+            {
+                "uid": str(user.id),
+                "active": user.is_active,
+                "su": user.is_superuser,
+            }
+        )
+    return claims
+
+
+def principal_from_claims(payload: dict) -> Optional[UserSlimS]:
+    if "uid" not in payload:
+        return None
+    return UserSlimS(
+        id=payload["uid"],
+        username=payload["sub"],
+        is_active=payload["active"],
+        is_superuser=payload["su"],
+        token_version=payload["ver"],
+    )
+
+
 def create_refresh_token(payload: dict) -> str:
     return create_jwt(
         token_type=TokenType.REFRESH,
@@ -0,0 +1,436 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import FrozenSet, List, Optional, Tuple
+from uuid import UUID
+
+import aioredis
+from sqlalchemy import select
+
+from shared.chat.models import ChatUser
+from shared.chat.schemas import MessageInfoS
+from shared.core.serialization import dumps
+from shared.database import session_context
+from shared.settings import settings
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "chat_members_invalidation"
+RECENT_INVALIDATION_CHANNEL = "recent_messages_invalidation"
+
+# Stored in every member set so an empty chat is cached too
+EMPTY_MARKER = "-"
+
+
+def members_key(chat_id: UUID) -> str:
+    return f"chat_members:{chat_id}"
+
+
+def members_version_key(chat_id: UUID) -> str:
+    return f"chat_members_version:{chat_id}"
+
+
+def recent_key(chat_id: UUID) -> str:
+    return f"recent_messages:{chat_id}"
+
+
+def recent_primed_key(chat_id: UUID) -> str:
+    return f"recent_messages_primed:{chat_id}"
+
+
+# KEYS[1] the member set, KEYS[2] the version bumped by every invalidation
+# ARGV[1] ttl, ARGV[2] version read before Postgres, ARGV[3..] members
+# Members loaded before an invalidation are dropped instead of stored.
+FILL_MEMBERS_SCRIPT = """
+if (redis.call('get', KEYS[2]) or '') ~= ARGV[2] then
+    return 0
+end
+redis.call('del', KEYS[1])
+for i = 3, #ARGV, 1000 do
+    redis.call('sadd', KEYS[1], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+redis.call('expire', KEYS[1], ARGV[1])
+return 1
+"""
+
+# KEYS[1] the list, KEYS[2] the primed flag
+# ARGV[1] size, ARGV[2] ttl, ARGV[3..] newest messages from Postgres, oldest first
+# Messages pushed while Postgres was read are kept after the loaded ones.
+PRIME_SCRIPT = """
+if redis.call('exists', KEYS[2]) == 1 then
+    return 0
+end
+local loaded = {}
+for i = 3, #ARGV do
+    loaded[cjson.decode(ARGV[i]).id] = true
+end
+local pushed = redis.call('lrange', KEYS[1], 0, -1)
+redis.call('del', KEYS[1])
+for i = 3, #ARGV do
+    redis.call('rpush', KEYS[1], ARGV[i])
+end
+for _, message in ipairs(pushed) do
+    if not loaded[cjson.decode(message).id] then
+        redis.call('rpush', KEYS[1], message)
+    end
+end
+redis.call('ltrim', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('expire', KEYS[1], ARGV[2])
+redis.call('set', KEYS[2], 1, 'EX', ARGV[2])
+return 1
+"""
+
+
+class ChatMembersCache:
+    """
+    Chat member sets kept in Redis, with a short-lived local near-cache in
+    front. Membership changes delete the Redis set, bump the chat's member
+    version and publish an invalidation so every process drops its local
+    copy. A set loaded from Postgres is only stored if the version is the
+    one read before the load.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.cache.CHAT_MEMBERS_TTL_SECONDS,
+        local_ttl_seconds: float = settings.cache.CHAT_MEMBERS_LOCAL_TTL_SECONDS,
+        local_max_size: int = settings.cache.CHAT_MEMBERS_LOCAL_MAX_SIZE,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = local_ttl_seconds
+        self.local_max_size = local_max_size
+        self._local: OrderedDict[UUID, Tuple[FrozenSet[UUID], float]] = OrderedDict()
+        self.redis: Optional[aioredis.Redis] = None
+        self.pubsub_redis: Optional[aioredis.Redis] = None
+        self._owns_redis = False
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.db_loads = 0
+
+    async def connect(
+        self,
+        redis: Optional[aioredis.Redis] = None,
+        pubsub_redis: Optional[aioredis.Redis] = None,
+    ):
+        """
+        Use the given clients, or open one.
+        """
+        self._owns_redis = redis is None
+        self.redis = redis or aioredis.from_url(
+            settings.redis.URL, decode_responses=True
+        )
+        self.pubsub_redis = pubsub_redis or self.redis
+        self._fill_script = self.redis.register_script(FILL_MEMBERS_SCRIPT)
+
+    async def is_member(self, chat_id: UUID, user_id: UUID) -> bool:
+        return user_id in await self.get_members(chat_id)
+
+    async def get_members(self, chat_id: UUID) -> FrozenSet[UUID]:
+        entry = self._local.get(chat_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self._local.move_to_end(chat_id)
+            self.local_hits += 1
+            return entry[0]
+
+        members, version = await self._get_redis_members(chat_id)
+        if members is None:
+            members = await self._load_members(chat_id)
+            if not await self._set_redis_members(chat_id, members, version):
+                # invalidated while loading, the next lookup loads again
+                return members
+
+        self._local[chat_id] = (members, time.monotonic() + self.local_ttl_seconds)
+        self._local.move_to_end(chat_id)
+        while len(self._local) > self.local_max_size:
+            self._local.popitem(last=False)
+        return members
+
+    async def _get_redis_members(
+        self, chat_id: UUID
+    ) -> Tuple[Optional[FrozenSet[UUID]], Optional[str]]:
+        """
+        The cached members of the chat, or None, and the current member version.
+        """
+        if not self.redis:
+            return None, None
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.smembers(members_key(chat_id))
+                pipe.get(members_version_key(chat_id))
+                raw, version = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Couldn't read members of chat {chat_id}: {e}")
+            return None, None
+        if not raw:
+            return None, version
+        self.redis_hits += 1
+        members = frozenset(UUID(member) for member in raw if member != EMPTY_MARKER)
+        return members, version
+
+    async def _set_redis_members(
+        self, chat_id: UUID, members: FrozenSet[UUID], version: Optional[str]
+    ) -> bool:
+        """
+        Store the members unless the chat was invalidated since `version` was read.
+        """
+        if not self.redis:
+            return True
+        try:
+            return bool(
+                await self._fill_script(
+                    keys=[members_key(chat_id), members_version_key(chat_id)],
+                    args=[
+                        self.ttl_seconds,
+                        version or "",
+                        EMPTY_MARKER,
+                        *(str(member) for member in members),
+                    ],
+                )
+            )
+        except Exception as e:
+            logger.error(f"Couldn't store members of chat {chat_id}: {e}")
+            return True
+
+    async def _load_members(self, chat_id: UUID) -> FrozenSet[UUID]:
+        self.db_loads += 1
+        async with session_context() as session:
+            result = await session.execute(
+                select(ChatUser.user_id).where(ChatUser.chat_id == chat_id)
+            )
+            return frozenset(result.scalars().all())
+
+    async def invalidate(self, chat_id: UUID):
+        """
+        Forget the members of the chat here, in Redis and in every other process.
+        """
+        self._local.pop(chat_id, None)
+        if not self.redis:
+            return
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(members_version_key(chat_id))
+                pipe.expire(members_version_key(chat_id), self.ttl_seconds)
+                pipe.delete(members_key(chat_id))
+                pipe.publish(INVALIDATION_CHANNEL, str(chat_id))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Couldn't invalidate members of chat {chat_id}: {e}")
+
+    async def listen_invalidations(self):
+        pubsub = self.pubsub_redis.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            try:
+                chat_id = UUID(message["data"])
+            except ValueError:
+                logger.error(f"Invalid chat members invalidation: {message['data']}")
+                continue
+            self._local.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "local_size": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "db_loads": self.db_loads,
+        }
+
+    async def close(self):
+        if self.redis and self._owns_redis:
+            await self.redis.close()
+        self.redis = None
+        self.pubsub_redis = None
+
+
+chat_members_cache = ChatMembersCache()
+
+
+class RecentMessagesCache:
+    """
+    The last `size` messages of every chat, as rendered MessageInfoS, in a
+    Redis list capped with LTRIM. New messages are pushed on write; the list
+    is only trusted once it has been primed from Postgres, so a chat that was
+    quiet since the cache expired falls back to the database once. A
+    short-lived local near-cache sits in front, dropped on every push.
+    """
+
+    def __init__(
+        self,
+        size: int = settings.cache.RECENT_MESSAGES_SIZE,
+        ttl_seconds: int = settings.cache.RECENT_MESSAGES_TTL_SECONDS,
+        local_ttl_seconds: float = settings.cache.RECENT_MESSAGES_LOCAL_TTL_SECONDS,
+        local_max_size: int = settings.cache.RECENT_MESSAGES_LOCAL_MAX_SIZE,
+    ):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.local_ttl_seconds = local_ttl_seconds
+        self.local_max_size = local_max_size
+        self._local: OrderedDict[UUID, Tuple[List[MessageInfoS], float]] = OrderedDict()
+        self.redis: Optional[aioredis.Redis] = None
+        self.pubsub_redis: Optional[aioredis.Redis] = None
+        self._owns_redis = False
+        self._prime_script = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.pushes = 0
+
+    async def connect(
+        self,
+        redis: Optional[aioredis.Redis] = None,
+        pubsub_redis: Optional[aioredis.Redis] = None,
+    ):
+        """
+        Use the given clients, or open one.
+        """
+        self._owns_redis = redis is None
+        self.redis = redis or aioredis.from_url(
+            settings.redis.URL, decode_responses=True
+        )
+        self.pubsub_redis = pubsub_redis or self.redis
+        self._prime_script = self.redis.register_script(PRIME_SCRIPT)
+
+    @property
+    def connected(self) -> bool:
+        return self.redis is not None
+
+    async def get(self, chat_id: UUID) -> Optional[List[MessageInfoS]]:
+        """
+        Up to `size` newest messages of the chat, oldest first, or None when
+        the chat isn't cached.
+        """
+        entry = self._local.get(chat_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self._local.move_to_end(chat_id)
+            self.local_hits += 1
+            return entry[0]
+
+        messages = await self._get_redis_messages(chat_id)
+        if messages is None:
+            self.misses += 1
+            return None
+        self.redis_hits += 1
+        self._set_local(chat_id, messages)
+        return messages
+
+    async def _get_redis_messages(self, chat_id: UUID) -> Optional[List[MessageInfoS]]:
+        if not self.redis:
+            return None
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.exists(recent_primed_key(chat_id))
+                pipe.lrange(recent_key(chat_id), 0, -1)
+                primed, raw = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Couldn't read recent messages of chat {chat_id}: {e}")
+            return None
+        if not primed:
+            return None
+        # A retried push may have stored a message twice
+        messages = {
+            message.id: message
+            for message in map(MessageInfoS.model_validate_json, raw)
+        }
+        # Writers on different processes may push slightly out of order
+        return sorted(messages.values(), key=lambda m: (m.created_at, m.id))
+
+    def _set_local(self, chat_id: UUID, messages: List[MessageInfoS]):
+        self._local[chat_id] = (messages, time.monotonic() + self.local_ttl_seconds)
+        self._local.move_to_end(chat_id)
+        while len(self._local) > self.local_max_size:
+            self._local.popitem(last=False)
+
+    async def push(self, chat_id: UUID, message: MessageInfoS):
+        """
+        Append a stored message to the chat's buffer and drop the local
+        copies of every process. A buffer that missed the message is dropped,
+        so the next read primes it again from Postgres.
+        """
+        self._local.pop(chat_id, None)
+        if not self.redis:
+            return
+        key = recent_key(chat_id)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, dumps(message))
+                pipe.ltrim(key, -self.size, -1)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(recent_primed_key(chat_id), self.ttl_seconds)
+                pipe.publish(RECENT_INVALIDATION_CHANNEL, str(chat_id))
+                await pipe.execute()
+            self.pushes += 1
+        except Exception as e:
+            logger.error(f"Couldn't push recent message of chat {chat_id}: {e}")
+            await self.invalidate(chat_id)
+
+    async def prime(self, chat_id: UUID, messages: List[MessageInfoS]):
+        """
+        Fill the chat's buffer with its newest messages loaded from Postgres,
+        oldest first, unless another process got there first.
+        """
+        if not self.redis:
+            return
+        try:
+            await self._prime_script(
+                keys=[recent_key(chat_id), recent_primed_key(chat_id)],
+                args=[
+                    self.size,
+                    self.ttl_seconds,
+                    *(dumps(m) for m in messages[-self.size :]),
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Couldn't prime recent messages of chat {chat_id}: {e}")
+
+    async def invalidate(self, chat_id: UUID):
+        """
+        Forget the chat's messages here, in Redis and in every other process.
+        """
+        self._local.pop(chat_id, None)
+        if not self.redis:
+            return
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(recent_key(chat_id), recent_primed_key(chat_id))
+                pipe.publish(RECENT_INVALIDATION_CHANNEL, str(chat_id))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Couldn't invalidate recent messages of chat {chat_id}: {e}")
+
+    async def listen_invalidations(self):
+        pubsub = self.pubsub_redis.pubsub()
+        await pubsub.subscribe(RECENT_INVALIDATION_CHANNEL)
+
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            try:
+                chat_id = UUID(message["data"])
+            except ValueError:
+                logger.error(f"Invalid recent messages invalidation: {message['data']}")
+                continue
+            self._local.pop(chat_id, None)
+
+    def stats(self) -> dict:
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+        return {
+            "local_size": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "pushes": self.pushes,
+        }
+
+    async def close(self):
+        if self.redis and self._owns_redis:
+            await self.redis.close()
+        self.redis = None
+        self.pubsub_redis = None
+
+
+recent_messages_cache = RecentMessagesCache()
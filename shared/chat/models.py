@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import UUID, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import UUID, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import ENUM as PGEnum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -41,10 +41,13 @@ class Chat(BaseUUID):
         nullable=False,
     )
 
+    # Deleting a chat leaves its members and messages to ON DELETE CASCADE
+    # instead of loading them
     users: Mapped[list[ChatUser]] = relationship(
         "ChatUser",
         back_populates="chat",
         cascade="all, delete-orphan",
+        passive_deletes=True,
         overlaps="chat_participations",
     )
 
@@ -52,12 +55,15 @@ class Chat(BaseUUID):
         "User",
         secondary="chat_users",
         back_populates="chat_participations",
+        passive_deletes=True,
         overlaps="chats,users",
     )
 
     messages: Mapped[list[Message]] = relationship(
         "Message",
         back_populates="chat",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     def __repr__(self):
@@ -78,15 +84,23 @@ class Message(BaseUUID):
         nullable=False,
     )
     content: Mapped[str] = mapped_column(nullable=False)
+    # Part of the primary key because the table is partitioned on it
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
-        nullable=False,
+        primary_key=True,
     )
 
     chat: Mapped[Chat] = relationship("Chat", back_populates="messages")
     user: Mapped[User] = relationship("User", back_populates="messages")
 
+    # Serves chat history pages: equality on chat_id, keyset on (created_at, id).
+    # Monthly and default partitions are created by shared.chat.partitions.
+    __table_args__ = (
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
     def __repr__(self):
         return f"<Message id={self.id} chat_id={self.chat_id} user_id={self.user_id} content={self.content}>"
 
@@ -114,7 +128,11 @@ class ChatUser(BaseUUID):
         "User", back_populates="chats", overlaps="chat_participations,user_participants"
     )
 
-    __table_args__ = (UniqueConstraint("chat_id", "user_id", name="uq_chat_user"),)
+    # uq_chat_user covers lookups by chat; the reverse index covers lookups by user
+    __table_args__ = (
+        UniqueConstraint("chat_id", "user_id", name="uq_chat_user"),
+        Index("ix_chat_users_user_id_chat_id", "user_id", "chat_id"),
+    )
 
     def __repr__(self):
         return f"<ChatUser id={self.id} chat_id={self.chat_id} user_id={self.user_id}>"
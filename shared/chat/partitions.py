@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import Iterator, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from shared.database import engine
+from shared.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Key of the advisory lock that serializes partition DDL between workers
+PARTITION_LOCK_ID = 0x6D657373
+
+# Catches rows no monthly partition covers, so a write never fails for lack
+# of a partition if maintenance falls behind
+DEFAULT_PARTITION = "messages_default"
+DEFAULT_PARTITION_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF messages DEFAULT"
+)
+
+EXISTING_PARTITIONS_SQL = """
+SELECT c.relname
+FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'messages'::regclass
+"""
+
+
+def month_start(moment: datetime | date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: date, last: date) -> Iterator[date]:
+    """Month starts from first through last, inclusive."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year}m{month.month:02d}"
+
+
+def partition_ddl(month: date) -> str:
+    """
+    Partition holding the messages of one UTC calendar month. The bounds
+    contain colons, so run it with exec_driver_sql rather than text().
+    """
+    lower, upper = month, add_months(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF messages "
+        f"FOR VALUES FROM ('{lower.isoformat()} 00:00:00+00') "
+        f"TO ('{upper.isoformat()} 00:00:00+00')"
+    )
+
+
+def moved_partition_ddl(month: date) -> List[str]:
+    """
+    Create the month's partition when the default partition exists. Rows of
+    that month already in the default partition would make plain CREATE fail,
+    so they are moved into the new partition.
+    """
+    lower, upper = month, add_months(month, 1)
+    name = partition_name(month)
+    in_month = (
+        f"created_at >= '{lower.isoformat()} 00:00:00+00' "
+        f"AND created_at < '{upper.isoformat()} 00:00:00+00'"
+    )
+    return [
+        f"CREATE TEMP TABLE {name}_moved ON COMMIT DROP AS "
+        f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}",
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}",
+        partition_ddl(month),
+        f"INSERT INTO messages SELECT * FROM {name}_moved",
+        f"DROP TABLE {name}_moved",
+    ]
+
+
+async def ensure_message_partitions(
+    conn: AsyncConnection,
+    now: Optional[datetime] = None,
+    months_ahead: int = settings.chat.PARTITION_MONTHS_AHEAD,
+) -> List[str]:
+    """
+    Create the missing partitions from last month through `months_ahead`
+    months from now, and the default partition, and return their names.
+    Last month is included so a write stamped just before midnight on the
+    1st still has somewhere to go.
+    """
+    current = month_start(now or datetime.now(timezone.utc))
+    wanted = {
+        partition_name(month): month
+        for month in months_between(
+            add_months(current, -1), add_months(current, months_ahead)
+        )
+    }
+    result = await conn.exec_driver_sql(EXISTING_PARTITIONS_SQL)
+    existing = set(result.scalars().all())
+    missing = sorted(set(wanted) - existing)
+    has_default = DEFAULT_PARTITION in existing
+    if not missing and has_default:
+        # Creating a partition locks the parent table, skip it when we can
+        return []
+
+    await conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({PARTITION_LOCK_ID})")
+    for name in missing:
+        if has_default:
+            for statement in moved_partition_ddl(wanted[name]):
+                await conn.exec_driver_sql(statement)
+        else:
+            await conn.exec_driver_sql(partition_ddl(wanted[name]))
+    if not has_default:
+        await conn.exec_driver_sql(DEFAULT_PARTITION_DDL)
+        missing.append(DEFAULT_PARTITION)
+    return missing
+
+
+async def run_partition_maintenance(
+    interval: float = settings.chat.PARTITION_CHECK_INTERVAL_SECONDS,
+):
+    while True:
+        try:
+            async with engine.begin() as conn:
+                created = await ensure_message_partitions(conn)
+            if created:
+                logger.info(f"Created message partitions: {', '.join(created)}")
+        except Exception as e:
+            logger.exception(f"Message partition maintenance failed: {e}")
+        await asyncio.sleep(interval)
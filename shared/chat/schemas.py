@@ -42,3 +42,11 @@ class MessageInfoS(BaseModel):
     content: str
 
     model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
+
+
+class MessagePageS(BaseModel):
+    # Oldest first. prev_cursor fetches older messages (before=),
+    # next_cursor newer ones (after=); None when there are no more.
+    messages: list[MessageInfoS]
+    prev_cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
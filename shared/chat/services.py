@@ -1,15 +1,19 @@
-from typing import Union
+from datetime import datetime
+from typing import AsyncIterator, Optional, Sequence, Union
 from uuid import UUID
 
-from sqlalchemy import and_, func, select
+from sqlalchemy import Row, Select, and_, func, insert, select, tuple_
 from sqlalchemy.exc import IntegrityError as SQLIntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from shared.chat.cache import chat_members_cache, recent_messages_cache
 from shared.chat.models import Chat, ChatType, ChatUser, Message
-from shared.chat.schemas import ChatCreateS, ChatUserS, MessageInfoS
+from shared.chat.schemas import ChatCreateS, ChatUserS, MessageInfoS, MessagePageS
+from shared.chat.utils import decode_cursor, encode_cursor
 from shared.error.custom_exceptions import (
     IntegrityError,
     NotFoundError,
+    ValidationError,
 )
 from shared.users.models import User
 
@@ -31,6 +35,11 @@ class ChatService:
     ) -> Union[Chat, None]:
         subq = (
             select(ChatUser.chat_id)
+            .where(
+                ChatUser.chat_id.in_(
+                    select(ChatUser.chat_id).where(ChatUser.user_id == user_one.id)
+                )
+            )
             .group_by(ChatUser.chat_id)
             .having(func.count(ChatUser.user_id) == 2)
             .having(func.bool_and(ChatUser.user_id.in_([user_one.id, user_two.id])))
@@ -71,12 +80,22 @@ class ChatService:
             raise NotFoundError(message="Chat not found")
         return db_chat
 
+    @staticmethod
+    async def get_chat_user(
+        session: AsyncSession, chat_id: UUID, user_id: UUID
+    ) -> Optional[ChatUser]:
+        stmt = select(ChatUser).where(
+            ChatUser.chat_id == chat_id, ChatUser.user_id == user_id
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
+
     @staticmethod
     async def get_user_chat_ids_in_list(
         session: AsyncSession, user: User, chat_ids: list[str]
     ) -> list[UUID]:
         stmt = select(ChatUser.chat_id).where(
-            ChatUser.user_id == user.id, Chat.id.in_(chat_ids)
+            ChatUser.user_id == user.id, ChatUser.chat_id.in_(chat_ids)
         )
         result = await session.execute(stmt)
         chat_ids = result.scalars().all()
@@ -89,6 +108,14 @@ class ChatService:
         chat_user = ChatUser(chat_id=chat.id, user_id=user.id, is_admin=is_admin)
         session.add(chat_user)
         await session.commit()
+        await chat_members_cache.invalidate(chat.id)
+
+    @staticmethod
+    async def delete_chat(session: AsyncSession, chat: Chat) -> None:
+        await session.delete(chat)
+        await session.commit()
+        await chat_members_cache.invalidate(chat.id)
+        await recent_messages_cache.invalidate(chat.id)
 
     @staticmethod
     async def get_chat_users(session: AsyncSession, chat: Chat) -> list[ChatUserS]:
@@ -123,15 +150,105 @@ class ChatService:
         return db_message
 
     @staticmethod
-    async def get_messages_by_chat(
-        session: AsyncSession, chat_id: UUID
-    ) -> list[MessageInfoS]:
+    async def create_messages(session: AsyncSession, messages: list[Message]) -> None:
+        """
+        Insert messages with a single multi-row INSERT. Ids and timestamps must
+        already be set, so nothing has to be read back.
+        """
+        stmt = insert(Message).values(
+            [
+                {
+                    "id": m.id,
+                    "chat_id": m.chat_id,
+                    "user_id": m.user_id,
+                    "content": m.content,
+                    "created_at": m.created_at,
+                }
+                for m in messages
+            ]
+        )
+        try:
+            await session.execute(stmt)
+            await session.commit()
+        except SQLIntegrityError:
+            await session.rollback()
+            raise IntegrityError(message="Invalid chat_id or user_id")
+
+    @staticmethod
+    def get_messages_page_stmt(
+        chat_id: UUID,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> Select:
+        """
+        Keyset query for one page of a chat's history. Fetches one extra row
+        to tell whether there are more messages in that direction.
+        """
+        key = tuple_(Message.created_at, Message.id)
         stmt = (
-            select(Message, User.username).join(User).where(Message.chat_id == chat_id)
+            select(Message, User.username)
+            .join(User)
+            .where(Message.chat_id == chat_id)
+            .limit(limit + 1)
+        )
+        # The row comparison alone doesn't prune partitions, the plain bound
+        # on created_at next to it does
+        if after is not None:
+            created_at, message_id = decode_cursor(after)
+            return stmt.where(
+                Message.created_at >= created_at,
+                key > tuple_(created_at, message_id),
+            ).order_by(Message.created_at.asc(), Message.id.asc())
+        if before is not None:
+            created_at, message_id = decode_cursor(before)
+            stmt = stmt.where(
+                Message.created_at <= created_at,
+                key < tuple_(created_at, message_id),
+            )
+        return stmt.order_by(Message.created_at.desc(), Message.id.desc())
+
+    @classmethod
+    async def get_messages_by_chat(
+        cls,
+        session: AsyncSession,
+        chat_id: UUID,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> MessagePageS:
+        """
+        One page of the chat's history, newest page when no cursor is given.
+        """
+        if before is not None and after is not None:
+            raise ValidationError(message="Use either before or after cursor")
+
+        # The newest page comes from the recent messages buffer when it can
+        use_recent = (
+            recent_messages_cache.connected
+            and before is None
+            and after is None
+            and limit <= recent_messages_cache.size
         )
+        if use_recent:
+            recent = await recent_messages_cache.get(chat_id)
+            if recent is not None:
+                # A full buffer may have older messages behind it
+                full = len(recent) >= recent_messages_cache.size
+                has_older = full or len(recent) > limit
+                return cls._message_page(recent[-limit:], has_older, False)
+
+        # On a miss load the whole buffer's worth to prime it
+        fetch = recent_messages_cache.size if use_recent else limit
+        stmt = cls.get_messages_page_stmt(chat_id, fetch, before, after)
         result = await session.execute(stmt)
-        messages = result.all()
-        messages_schemas = [
+        rows = result.all()
+        has_more = len(rows) > fetch
+        rows = rows[:fetch]
+        if after is None:
+            rows.reverse()
+
+        messages = [
             MessageInfoS(
                 id=m.id,
                 user_id=m.user_id,
@@ -139,6 +256,77 @@ class ChatService:
                 created_at=m.created_at,
                 content=m.content,
             )
-            for m, username in messages
+            for m, username in rows
         ]
-        return messages_schemas
+        if use_recent:
+            await recent_messages_cache.prime(chat_id, messages)
+            has_more = has_more or len(messages) > limit
+            messages = messages[-limit:]
+
+        # Paging from a cursor means the cursor row is behind us
+        if after is None:
+            has_older, has_newer = has_more, before is not None
+        else:
+            has_older, has_newer = True, has_more
+        return cls._message_page(messages, has_older, has_newer)
+
+    @staticmethod
+    def _message_page(
+        messages: list[MessageInfoS], has_older: bool, has_newer: bool
+    ) -> MessagePageS:
+        page = MessagePageS(messages=messages)
+        if not messages:
+            return page
+        oldest, newest = messages[0], messages[-1]
+        if has_older:
+            page.prev_cursor = encode_cursor(oldest.created_at, oldest.id)
+        if has_newer:
+            page.next_cursor = encode_cursor(newest.created_at, newest.id)
+        return page
+
+    @staticmethod
+    def get_messages_export_stmt(
+        chat_id: UUID,
+        batch_size: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Select:
+        # Plain columns rather than ORM entities, so nothing piles up in the
+        # session's identity map while the cursor is read
+        stmt = (
+            select(
+                Message.id,
+                Message.user_id,
+                User.username,
+                Message.created_at,
+                Message.content,
+            )
+            .join(User)
+            .where(Message.chat_id == chat_id)
+            .order_by(Message.created_at.asc(), Message.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        # Only the partitions overlapping [since, until) are scanned
+        if since is not None:
+            stmt = stmt.where(Message.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(Message.created_at < until)
+        return stmt
+
+    @classmethod
+    async def stream_messages(
+        cls,
+        session: AsyncSession,
+        chat_id: UUID,
+        batch_size: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Chat history in [since, until), oldest first, read from a server-side
+        cursor batch_size rows at a time.
+        """
+        stmt = cls.get_messages_export_stmt(chat_id, batch_size, since, until)
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
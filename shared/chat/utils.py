@@ -0,0 +1,49 @@
+import base64
+import binascii
+import zlib
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import Row
+
+from shared.core.serialization import dumps
+from shared.error.custom_exceptions import ValidationError
+
+
+def encode_cursor(created_at: datetime, message_id: UUID) -> str:
+    """
+    Opaque cursor pointing at a message in the (created_at, id) order.
+    """
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|")
+        created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            raise ValueError("naive timestamp")
+        return created_at, UUID(message_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError(message="Invalid cursor")
+
+
+async def encode_ndjson(
+    batches: AsyncIterable[Sequence[Row]], compress: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    One JSON object per row, one chunk per batch. With compress the chunks
+    form a single gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    async for rows in batches:
+        chunk = b"".join([dumps(row._asdict()) + b"\n" for row in rows])
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from shared.chat.models import Message
+from shared.chat.services import ChatService
+from shared.database import session_context
+from shared.error.custom_exceptions import IntegrityError
+from shared.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages. Messages written within
+    `max_delay_ms` of each other are stored with one INSERT, and each caller
+    is released only after its batch is committed.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = settings.chat.WRITE_BATCH_SIZE,
+        max_delay_ms: float = settings.chat.WRITE_BATCH_DELAY_MS,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_delay_ms = max_delay_ms
+        self._pending: List[Tuple[Message, asyncio.Future]] = []
+        self._batch_full = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def write(self, chat_id: UUID, user_id: UUID, content: str) -> Message:
+        message = Message(
+            id=uuid.uuid4(),
+            chat_id=chat_id,
+            user_id=user_id,
+            content=content,
+            created_at=datetime.now(timezone.utc),
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        try:
+            try:
+                await asyncio.wait_for(
+                    self._batch_full.wait(), timeout=self.max_delay_ms / 1000
+                )
+            except asyncio.TimeoutError:
+                pass
+            while self._pending:
+                self._batch_full.clear()
+                batch = self._pending[: self.max_batch_size]
+                del self._pending[: self.max_batch_size]
+                await self._store(batch)
+        finally:
+            self._flush_task = None
+
+    async def _store(self, batch: List[Tuple[Message, asyncio.Future]]):
+        try:
+            async with session_context() as session:
+                await ChatService.create_messages(session, [m for m, _ in batch])
+        except IntegrityError:
+            if len(batch) == 1:
+                self._set_exception(batch, IntegrityError("Invalid chat_id or user_id"))
+                return
+            # One bad row fails the whole INSERT, find it row by row
+            for item in batch:
+                await self._store([item])
+            return
+        except Exception as e:
+            logger.exception(f"Error storing {len(batch)} messages: {e}")
+            self._set_exception(batch, e)
+            return
+
+        for message, future in batch:
+            if not future.done():
+                future.set_result(message)
+
+    @staticmethod
+    def _set_exception(batch: List[Tuple[Message, asyncio.Future]], exc: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def close(self):
+        if self._flush_task:
+            self._batch_full.set()
+            await self._flush_task
+
+
+message_writer = MessageWriter()
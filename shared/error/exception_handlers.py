@@ -2,9 +2,9 @@ import logging
 
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
 from ddd_shared.infra.domain.exceptions import DomainError
+from shared.core.serialization import FastJSONResponse
 from shared.error.custom_exceptions import (
     APIError,
     DatabaseError,
@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 def setup_custom_exception_handlers(app: FastAPI):
     @app.exception_handler(DatabaseError)
     async def database_exception_handler(request: Request, exc: DatabaseError):
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=exc.status_code,
             content={
                 "error": exc.error,
@@ -27,7 +27,7 @@ def setup_custom_exception_handlers(app: FastAPI):
 
     @app.exception_handler(DomainError)
     async def domain_exception_handler(request: Request, exc: DomainError):
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=exc.status_code,
             content={
                 "error": exc.error,
@@ -38,7 +38,7 @@ def setup_custom_exception_handlers(app: FastAPI):
 
     @app.exception_handler(APIError)
     async def api_exception_handler(request: Request, exc: APIError):
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=exc.status_code,
             content={
                 "error": exc.error,
@@ -51,7 +51,7 @@ def setup_custom_exception_handlers(app: FastAPI):
     async def pydantic_validation_exception_handler(
         request: Request, exc: RequestValidationError
     ):
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             content={
                 "error": "Validation Error",
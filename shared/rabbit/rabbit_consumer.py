@@ -1,12 +1,12 @@
-import json
 import logging
 
 from aio_pika.message import AbstractIncomingMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from shared.core.serialization import JSONDecodeError, loads
 from shared.database import session_context
 from shared.rabbit.rabbit_manager import RabbitManager, rabbit_manager
-from shared.redis import redis_publish
+from shared.redis import redis_manager
 from shared.users.services import UserService
 from shared.websocket.schemas import WSPushNotificationS
 
@@ -29,9 +29,9 @@ class RabbitConsumer:
     ):
         try:
             try:
-                payload = json.loads(message.body.decode("utf-8"))
+                payload = loads(message.body)
 
-            except json.JSONDecodeError as e:
+            except JSONDecodeError as e:
                 logger.error(f"Invalid JSON in RabbitMQ message: {e}")
                 await message.ack()
                 return
@@ -44,7 +44,9 @@ class RabbitConsumer:
                 return
 
             try:
-                user = await UserService.get_user_by_id(session, ws_message.user_id)
+                user = await UserService.get_slim_user_by_id(
+                    session, ws_message.user_id
+                )
                 if not user:
                     logger.warning(f"User {ws_message.user_id} not found")
                     await message.ack()
@@ -58,7 +60,9 @@ class RabbitConsumer:
                 return
 
             try:
-                await redis_publish("push_notifications", ws_message.model_dump_json())
+                await redis_manager.publish(
+                    "push_notifications", ws_message.model_dump_json()
+                )
             except Exception as e:
                 logger.exception(f"Error redis publishing message: {e}")
                 message.ack()
@@ -1,8 +1,8 @@
-import json
 import logging
 
 import aio_pika
 
+from shared.core.serialization import dumps
 from shared.settings import settings
 
 logger = logging.getLogger("uvicorn")
@@ -26,7 +26,7 @@ class RabbitManager:
         if not self.channel:
             raise RuntimeError("RabbitMQ connection is not established")
         await self.channel.declare_queue(queue_name, durable=True)
-        body = json.dumps(message).encode("utf-8")
+        body = dumps(message)
         await self.channel.default_exchange.publish(
             aio_pika.Message(body=body), routing_key=queue_name
         )
@@ -1,9 +1,14 @@
 import asyncio
 import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
 
 import aioredis
+from fastapi import WebSocket
 
 from app_ws.services import chat_ws_service
+from app_ws.ws_manager import ConnectionManager, manager
 
 from .settings import settings
 
@@ -12,21 +17,330 @@ logger = logging.getLogger(__name__)
 stop_event = asyncio.Event()
 
 
-async def redis_chat_subscribe():
-    redis = aioredis.from_url(settings.redis.URL, decode_responses=True)
-    pubsub = redis.pubsub()
+class RedisManager:
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = settings.redis.MAX_CONNECTIONS,
+        pubsub_max_connections: int = settings.redis.PUBSUB_MAX_CONNECTIONS,
+        pool_timeout: float = settings.redis.POOL_TIMEOUT_SECONDS,
+        publish_batch_size: int = settings.redis.PUBLISH_BATCH_SIZE,
+    ):
+        self.url = url
+        self.max_connections = max_connections
+        self.pubsub_max_connections = pubsub_max_connections
+        self.pool_timeout = pool_timeout
+        self.publish_batch_size = publish_batch_size
+        self.redis: Optional[aioredis.Redis] = None
+        # Long-lived listeners use their own pool so they can't starve commands
+        self.pubsub_redis: Optional[aioredis.Redis] = None
+        self._pending: List[Tuple[str, tuple, dict, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
 
-    await pubsub.subscribe("chat_channel")
+    def _client(self, max_connections: int) -> aioredis.Redis:
+        # A blocking pool makes callers wait for a free connection instead of
+        # failing with "Too many connections" under load
+        pool = aioredis.BlockingConnectionPool.from_url(
+            self.url,
+            decode_responses=True,
+            max_connections=max_connections,
+            timeout=self.pool_timeout,
+        )
+        return aioredis.Redis(connection_pool=pool)
 
-    async for message in pubsub.listen():
-        data = message["data"]
-        if isinstance(data, str):
-            await chat_ws_service.handle_data(message["data"])
+    async def connect(self):
+        self.redis = self._client(self.max_connections)
+        self.pubsub_redis = self._client(self.pubsub_max_connections)
+        logger.info("Redis connected")
+
+    async def publish(self, channel: str, data: str) -> int:
+        """
+        Publish data to the channel. Commands issued within the same loop
+        tick are sent to Redis in one pipeline.
+        """
+        return await self._pipelined("publish", channel, data)
+
+    async def add_to_stream(self, stream: str, data: str, maxlen: int) -> str:
+        """
+        Append data to the stream, trimming it to roughly maxlen entries.
+        Returns the entry id.
+        """
+        return await self._pipelined(
+            "xadd", stream, {"data": data}, maxlen=maxlen, approximate=True
+        )
+
+    async def _pipelined(self, command: str, *args, **kwargs):
+        if not self.redis:
+            raise RuntimeError("Redis connection is not established")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((command, args, kwargs, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self):
+        try:
+            while self._pending:
+                batch = self._pending[: self.publish_batch_size]
+                del self._pending[: self.publish_batch_size]
+                try:
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for command, args, kwargs, _ in batch:
+                            getattr(pipe, command)(*args, **kwargs)
+                        results = await pipe.execute()
+                except Exception as e:
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (*_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._flush_task = None
+
+    async def close(self):
+        if self._flush_task:
+            await self._flush_task
+        for client in (self.redis, self.pubsub_redis):
+            if client:
+                await client.close()
+                await client.connection_pool.disconnect()
+
+
+redis_manager = RedisManager(settings.redis.URL)
+
+
+def chat_channel(chat_id: UUID) -> str:
+    return f"chat:{chat_id}"
+
+
+def chat_id_from_key(key: str) -> UUID:
+    # Works for both chat:{chat_id} and chat_stream:{chat_id}
+    return UUID(key.rsplit(":", 1)[1])
+
+
+def chat_stream(chat_id: UUID) -> str:
+    return f"chat_stream:{chat_id}"
+
+
+def stream_id_key(stream_id: str) -> Tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class RedisChatChannels:
+    """
+    Pub/sub chat bus. Keeps the worker subscribed to chat:{chat_id} only while
+    the connection manager has local subscribers for that chat.
+    """
+
+    def __init__(self, manager: ConnectionManager):
+        self.manager = manager
+        self.pubsub = None
+        self._commands: asyncio.Queue[Tuple[str, str]] = asyncio.Queue()
+        self._has_channels = asyncio.Event()
+
+    async def publish(self, chat_id: UUID, data: str):
+        await redis_manager.publish(chat_channel(chat_id), data)
+
+    async def replay(self, ws: WebSocket, chat_id: UUID, last_id: str) -> int:
+        # Pub/sub keeps no history
+        return 0
+
+    def add_chat(self, chat_id: UUID):
+        self._commands.put_nowait(("subscribe", chat_channel(chat_id)))
+
+    def remove_chat(self, chat_id: UUID):
+        self._commands.put_nowait(("unsubscribe", chat_channel(chat_id)))
+
+    async def _apply_commands(self):
+        # Applied one by one so a quick subscribe/unsubscribe keeps its order
+        while True:
+            command, channel = await self._commands.get()
+            try:
+                if command == "subscribe":
+                    await self.pubsub.subscribe(channel)
+                    self._has_channels.set()
+                else:
+                    await self.pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.error(f"Redis {command} {channel} failed: {e}")
+
+    async def listen(self):
+        self.pubsub = redis_manager.pubsub_redis.pubsub()
+        self.manager.on_chat_added = self.add_chat
+        self.manager.on_chat_removed = self.remove_chat
+        for chat_id in self.manager.chat_subscriptions:
+            self.add_chat(chat_id)
+
+        commands_task = asyncio.create_task(self._apply_commands())
+        try:
+            while True:
+                await self._has_channels.wait()
+                # listen() returns once the last channel is unsubscribed
+                async for message in self.pubsub.listen():
+                    data = message["data"]
+                    if message["type"] == "message" and isinstance(data, str):
+                        await chat_ws_service.handle_chat_frame(
+                            chat_id_from_key(message["channel"]), data
+                        )
+                if not self.pubsub.subscribed:
+                    self._has_channels.clear()
+        finally:
+            self.manager.on_chat_added = None
+            self.manager.on_chat_removed = None
+            commands_task.cancel()
+
+
+class RedisChatStreams:
+    """
+    Redis Streams chat bus. Every chat has a capped stream, the worker reads
+    the streams of chats with local subscribers from the last id it has seen,
+    so a lagging worker catches up instead of losing events and clients can
+    resume from the stream id of the last event they received.
+    """
+
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        maxlen: int = settings.redis.STREAM_MAXLEN,
+        block_ms: int = settings.redis.STREAM_BLOCK_MS,
+        read_count: int = settings.redis.STREAM_READ_COUNT,
+        replay_max: int = settings.redis.STREAM_REPLAY_MAX,
+        clock_sync_seconds: float = settings.redis.STREAM_CLOCK_SYNC_SECONDS,
+    ):
+        self.manager = manager
+        self.maxlen = maxlen
+        self.block_ms = block_ms
+        self.read_count = read_count
+        self.replay_max = replay_max
+        self.clock_sync_seconds = clock_sync_seconds
+        # stream -> id of the last entry handled
+        self.last_ids: Dict[str, str] = {}
+        # Redis clock minus ours, stream ids are stamped with the Redis clock
+        self.clock_offset_ms = 0.0
+        self._next_clock_sync = 0.0
+        self._has_streams = asyncio.Event()
+
+    async def publish(self, chat_id: UUID, data: str):
+        await redis_manager.add_to_stream(chat_stream(chat_id), data, self.maxlen)
+
+    async def replay(self, ws: WebSocket, chat_id: UUID, last_id: str) -> int:
+        """
+        Send the socket the events of the chat added after last_id, in chunks
+        its outbound queue can take. A gap over replay_max events, or one the
+        stream was trimmed past, gets a "resync" event instead and the client
+        reloads the history over HTTP. Returns the number of events sent.
+        """
+        stream = chat_stream(chat_id)
+        async with redis_manager.redis.pipeline(transaction=False) as pipe:
+            pipe.xrange(stream, min="-", max="+", count=1)
+            pipe.xrange(stream, min=f"({last_id}", max="+", count=self.replay_max + 1)
+            oldest, entries = await pipe.execute()
+        trimmed = bool(oldest) and stream_id_key(oldest[0][0]) > stream_id_key(last_id)
+        if trimmed or len(entries) > self.replay_max:
+            await self.manager.send_json_to_socket(
+                ws, {"action": "resync", "chat_id": str(chat_id)}
+            )
+            return 0
+
+        # Leave room for live events arriving meanwhile
+        chunk = max(1, self.manager.queue_high_water // 2)
+        sent = 0
+        for start in range(0, len(entries), chunk):
+            if not await self.manager.wait_for_room(ws, chunk):
+                break
+            for entry_id, fields in entries[start : start + chunk]:
+                await self._handle_entry(chat_id, entry_id, fields, ws)
+                sent += 1
+        return sent
+
+    async def sync_clock(self):
+        before = time.time()
+        seconds, microseconds = await redis_manager.redis.time()
+        after = time.time()
+        redis_ms = seconds * 1000 + microseconds / 1000
+        self.clock_offset_ms = redis_ms - (before + after) / 2 * 1000
+        self._next_clock_sync = time.monotonic() + self.clock_sync_seconds
+
+    async def _sync_clock_if_due(self):
+        if time.monotonic() < self._next_clock_sync:
+            return
+        try:
+            await self.sync_clock()
+        except Exception as e:
+            logger.error(f"Couldn't read the Redis clock: {e}")
+
+    def add_chat(self, chat_id: UUID):
+        # Stream ids start with a millisecond timestamp of the Redis clock, so
+        # reading after Redis' "now" also covers entries added before the next
+        # XREAD picks the stream up
+        redis_now_ms = time.time() * 1000 + self.clock_offset_ms
+        self.last_ids[chat_stream(chat_id)] = f"{int(redis_now_ms)}-0"
+        self._has_streams.set()
+
+    def remove_chat(self, chat_id: UUID):
+        self.last_ids.pop(chat_stream(chat_id), None)
+
+    async def _handle_entry(
+        self,
+        chat_id: UUID,
+        entry_id: str,
+        fields: dict,
+        ws: Optional[WebSocket] = None,
+    ):
+        frame = fields.get("data")
+        if not frame:
+            logger.error(f"Invalid stream entry {entry_id}: no data")
+            return
+        frame = chat_ws_service.with_stream_id(frame, entry_id)
+        if ws is None:
+            await chat_ws_service.handle_chat_frame(chat_id, frame)
+        else:
+            await chat_ws_service.send_chat_frame_to_socket(ws, frame)
+
+    async def listen(self):
+        await self._sync_clock_if_due()
+        self.manager.on_chat_added = self.add_chat
+        self.manager.on_chat_removed = self.remove_chat
+        for chat_id in self.manager.chat_subscriptions:
+            self.add_chat(chat_id)
+
+        try:
+            while True:
+                await self._sync_clock_if_due()
+                if not self.last_ids:
+                    self._has_streams.clear()
+                    await self._has_streams.wait()
+                    continue
+                response = await redis_manager.pubsub_redis.xread(
+                    dict(self.last_ids), count=self.read_count, block=self.block_ms
+                )
+                for stream, entries in response or []:
+                    for entry_id, fields in entries:
+                        if stream in self.last_ids:
+                            self.last_ids[stream] = entry_id
+                        await self._handle_entry(
+                            chat_id_from_key(stream), entry_id, fields
+                        )
+        finally:
+            self.manager.on_chat_added = None
+            self.manager.on_chat_removed = None
+
+
+if settings.redis.CHAT_BUS == "streams":
+    chat_bus = RedisChatStreams(manager)
+else:
+    chat_bus = RedisChatChannels(manager)
+
+
+async def redis_chat_subscribe():
+    await chat_bus.listen()
 
 
 async def redis_push_notifications_subscribe():
-    redis = aioredis.from_url(settings.redis.URL, decode_responses=True)
-    pubsub = redis.pubsub()
+    pubsub = redis_manager.pubsub_redis.pubsub()
 
     await pubsub.subscribe("push_notifications")
 
@@ -34,8 +348,3 @@ async def redis_push_notifications_subscribe():
         data = message["data"]
         if isinstance(data, str):
             await chat_ws_service.handle_data(data)
-
-
-async def redis_publish(channel, data):
-    redis = aioredis.from_url(settings.redis.URL, decode_responses=True)
-    await redis.publish(channel, data)
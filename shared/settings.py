@@ -1,5 +1,6 @@
 import logging
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -25,6 +26,71 @@ class RMQSettings(BaseModel):
 
 class RedisSettings(BaseModel):
     URL: str
+    MAX_CONNECTIONS: int = 50
+    # How long a command waits for a free pooled connection before failing
+    POOL_TIMEOUT_SECONDS: float = 5.0
+    # Pub/sub listeners and blocking stream reads hold their connection
+    PUBSUB_MAX_CONNECTIONS: int = 10
+    PUBLISH_BATCH_SIZE: int = 500
+    # "pubsub" is fire-and-forget, "streams" keeps history for replay
+    CHAT_BUS: Literal["pubsub", "streams"] = "pubsub"
+    STREAM_MAXLEN: int = 10000
+    STREAM_BLOCK_MS: int = 1000
+    STREAM_READ_COUNT: int = 500
+    # Larger resume gaps get a "resync" instead of a replay
+    STREAM_REPLAY_MAX: int = 1000
+    STREAM_CLOCK_SYNC_SECONDS: float = 60.0
+
+
+class WSSettings(BaseModel):
+    OUTBOUND_QUEUE_HIGH_WATER: int = 256
+    # "close" evicts a socket whose queue is full, "drop" discards its oldest frame
+    SLOW_CONSUMER_POLICY: Literal["close", "drop"] = "close"
+    SEND_TIMEOUT_SECONDS: float = 5.0
+    # Coalescing for sockets connected with ?batch=true
+    BATCH_MAX_DELAY_MS: float = 15.0
+    BATCH_MAX_SIZE: int = 50
+    # Sockets silent for PING_INTERVAL get a ping, for IDLE_TIMEOUT are reaped
+    PING_INTERVAL_SECONDS: float = 25.0
+    IDLE_TIMEOUT_SECONDS: float = 75.0
+    REAP_INTERVAL_SECONDS: float = 10.0
+
+
+class ChatSettings(BaseModel):
+    WRITE_BATCH_SIZE: int = 500
+    WRITE_BATCH_DELAY_MS: float = 5.0
+    HISTORY_PAGE_SIZE: int = 50
+    HISTORY_MAX_PAGE_SIZE: int = 200
+    EXPORT_BATCH_SIZE: int = 1000
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_CHECK_INTERVAL_SECONDS: float = 3600.0
+
+
+class CacheSettings(BaseModel):
+    USER_MAX_SIZE: int = 10000
+    USER_TTL_SECONDS: float = 60.0
+    CHAT_MEMBERS_TTL_SECONDS: int = 3600
+    CHAT_MEMBERS_LOCAL_TTL_SECONDS: float = 5.0
+    CHAT_MEMBERS_LOCAL_MAX_SIZE: int = 10000
+    JWT_MAX_SIZE: int = 10000
+    # Kept above HISTORY_PAGE_SIZE so the newest page is always in the buffer
+    RECENT_MESSAGES_SIZE: int = 100
+    RECENT_MESSAGES_TTL_SECONDS: int = 86400
+    RECENT_MESSAGES_LOCAL_TTL_SECONDS: float = 5.0
+    RECENT_MESSAGES_LOCAL_MAX_SIZE: int = 10000
+
+
+class RateLimitSettings(BaseModel):
+    ENABLED: bool = True
+    # Token buckets: RATE tokens per second refill up to BURST, one per action
+    CONNECTION_MESSAGE_RATE: float = 5.0
+    CONNECTION_MESSAGE_BURST: int = 20
+    USER_MESSAGE_RATE: float = 10.0
+    USER_MESSAGE_BURST: int = 40
+    CONNECTION_SUBSCRIBE_RATE: float = 1.0
+    CONNECTION_SUBSCRIBE_BURST: int = 10
+    USER_SUBSCRIBE_RATE: float = 2.0
+    USER_SUBSCRIBE_BURST: int = 20
 
 
 class JwtSettings(BaseModel):
@@ -33,6 +99,7 @@ class JwtSettings(BaseModel):
     ALGORITHM: str = "RS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 1
+    PRINCIPAL_CLAIMS: bool = False
 
 
 class EmailSettings(BaseModel):
@@ -53,6 +120,10 @@ class CommonSettings(BaseSettings):
     email: EmailSettings
     jwt: JwtSettings = JwtSettings()
     media: MediaSettings = MediaSettings()
+    ws: WSSettings = WSSettings()
+    chat: ChatSettings = ChatSettings()
+    cache: CacheSettings = CacheSettings()
+    rate_limit: RateLimitSettings = RateLimitSettings()
 
 
 settings = CommonSettings()
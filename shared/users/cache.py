@@ -0,0 +1,151 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+import aioredis
+
+from shared.settings import settings
+from shared.users.schemas import UserSlimS
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "user_invalidation"
+
+
+class UserCache:
+    """
+    Per-process LRU cache of slim users with a TTL. Changes to a user are
+    published to every process so their copies are dropped as well.
+    Token versions of users that aren't cached whole are kept on the side,
+    so checking a token with principal claims never needs the full user.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.cache.USER_MAX_SIZE,
+        ttl_seconds: float = settings.cache.USER_TTL_SECONDS,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._users: OrderedDict[UUID, Tuple[UserSlimS, float]] = OrderedDict()
+        self._ids_by_username: Dict[str, UUID] = {}
+        self._versions: OrderedDict[UUID, Tuple[int, float]] = OrderedDict()
+        self.redis: Optional[aioredis.Redis] = None
+        self.pubsub_redis: Optional[aioredis.Redis] = None
+        self._owns_redis = False
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def connect(
+        self,
+        redis: Optional[aioredis.Redis] = None,
+        pubsub_redis: Optional[aioredis.Redis] = None,
+    ):
+        """
+        Use the given clients for invalidations, or open one.
+        """
+        self._owns_redis = redis is None
+        self.redis = redis or aioredis.from_url(
+            settings.redis.URL, decode_responses=True
+        )
+        self.pubsub_redis = pubsub_redis or self.redis
+
+    def get(self, user_id: UUID) -> Optional[UserSlimS]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at < time.monotonic():
+            self._drop(user_id)
+            self.misses += 1
+            return None
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return user
+
+    def get_by_username(self, username: str) -> Optional[UserSlimS]:
+        user_id = self._ids_by_username.get(username)
+        if user_id is None:
+            self.misses += 1
+            return None
+        return self.get(user_id)
+
+    def get_token_version(self, user_id: UUID) -> Optional[int]:
+        entry = self._users.get(user_id) or self._versions.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        value = entry[0]
+        return value if isinstance(value, int) else value.token_version
+
+    def set_token_version(self, user_id: UUID, token_version: int):
+        self._versions[user_id] = (token_version, time.monotonic() + self.ttl_seconds)
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_size:
+            self._versions.popitem(last=False)
+
+    def set(self, user: UserSlimS):
+        self._drop(user.id)
+        self._users[user.id] = (user, time.monotonic() + self.ttl_seconds)
+        self._ids_by_username[user.username] = user.id
+        while len(self._users) > self.max_size:
+            oldest_id = next(iter(self._users))
+            self._drop(oldest_id)
+
+    def _drop(self, user_id: UUID):
+        self._versions.pop(user_id, None)
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._ids_by_username.pop(entry[0].username, None)
+
+    async def invalidate(self, user_id: UUID):
+        """
+        Drop the user here and in every other process.
+        """
+        self._drop(user_id)
+        self.invalidations += 1
+        if not self.redis:
+            return
+        try:
+            await self.redis.publish(INVALIDATION_CHANNEL, str(user_id))
+        except Exception as e:
+            logger.error(f"Couldn't publish invalidation of user {user_id}: {e}")
+
+    async def listen_invalidations(self):
+        pubsub = self.pubsub_redis.pubsub()
+        await pubsub.subscribe(INVALIDATION_CHANNEL)
+
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            try:
+                user_id = UUID(message["data"])
+            except ValueError:
+                logger.error(f"Invalid user invalidation: {message['data']}")
+                continue
+            self._drop(user_id)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    async def close(self):
+        if self.redis and self._owns_redis:
+            await self.redis.close()
+        self.redis = None
+        self.pubsub_redis = None
+
+
+user_cache = UserCache()
@@ -21,6 +21,8 @@ class User(BaseUUID):
 
     is_superuser: Mapped[bool] = mapped_column(default=False, server_default="false")
 
+    token_version: Mapped[int] = mapped_column(default=0, server_default="0")
+
     chats: Mapped[list["ChatUser"]] = relationship(
         "ChatUser",
         back_populates="user",
@@ -28,6 +28,16 @@ class UserS(UserBaseS):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserSlimS(BaseModel):
+    id: UUID
+    username: str
+    is_active: bool
+    is_superuser: bool
+    token_version: int = 0
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class SuperUserS(UserS):
     is_superuser: bool
 
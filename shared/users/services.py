@@ -7,8 +7,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from shared.core.utils import hash_password
 from shared.error.custom_exceptions import IntegrityError, NotFoundError
+from shared.users.cache import user_cache
 from shared.users.models import User
-from shared.users.schemas import SuperUserCreateS, SuperUserUpdateS, UserCreateS
+from shared.users.schemas import (
+    SuperUserCreateS,
+    SuperUserUpdateS,
+    UserCreateS,
+    UserSlimS,
+)
 
 
 class UserService:
@@ -58,6 +64,49 @@ class UserService:
             raise NotFoundError(message="User not found")
         return db_user
 
+    @classmethod
+    async def get_slim_user_by_id(
+        cls, session: AsyncSession, user_id: UUID
+    ) -> UserSlimS:
+        """
+        Cached lookup for hot paths that only need identity and status flags.
+        """
+        user = user_cache.get(user_id)
+        if user is None:
+            db_user = await cls.get_user_by_id(session, user_id)
+            user = UserSlimS.model_validate(db_user)
+            user_cache.set(user)
+        return user
+
+    @staticmethod
+    async def get_token_version(session: AsyncSession, user_id: UUID) -> int:
+        """
+        Cached lookup of the version tokens of the user must carry.
+        """
+        token_version = user_cache.get_token_version(user_id)
+        if token_version is None:
+            stmt = select(User.token_version).where(User.id == user_id)
+            result = await session.execute(stmt)
+            token_version = result.scalar_one_or_none()
+            if token_version is None:
+                raise NotFoundError(message="User not found")
+            user_cache.set_token_version(user_id, token_version)
+        return token_version
+
+    @classmethod
+    async def get_slim_user_by_username(
+        cls, session: AsyncSession, username: str
+    ) -> UserSlimS:
+        """
+        Cached lookup for hot paths that only need identity and status flags.
+        """
+        user = user_cache.get_by_username(username)
+        if user is None:
+            db_user = await cls.get_user_by_username(session, username)
+            user = UserSlimS.model_validate(db_user)
+            user_cache.set(user)
+        return user
+
     @staticmethod
     async def get_user_by_email(session: AsyncSession, email: str) -> User:
         stmt = select(User).where(User.email == email)
@@ -71,6 +120,7 @@ class UserService:
     async def delete_user(cls, session: AsyncSession, user: User) -> None:
         await session.delete(user)
         await session.commit()
+        await user_cache.invalidate(user.id)
 
     @staticmethod
     async def update_user(
@@ -78,9 +128,11 @@ class UserService:
     ) -> User:
         for key, value in user_data.model_dump().items():
             setattr(db_user, key, value)
+        db_user.token_version += 1
 
         await session.commit()
         await session.refresh(db_user)
+        await user_cache.invalidate(db_user.id)
         return db_user
 
     @staticmethod
@@ -88,6 +140,8 @@ class UserService:
         if user.is_active:
             return User
         user.is_active = True
+        user.token_version += 1
         await session.commit()
         await session.refresh(user)
+        await user_cache.invalidate(user.id)
         return user
@@ -1,7 +1,7 @@
-from typing import List, Optional
+from typing import Annotated, Dict, List, Literal, Optional, Union
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class WSMessageBase(BaseModel):
@@ -10,15 +10,30 @@ class WSMessageBase(BaseModel):
 
 
 class WSSubscribe(WSMessageBase):
-    action: str = "subscribe"
+    action: Literal["subscribe"] = "subscribe"
     chat_ids: List[UUID] = Field(..., min_items=1)
+    # chat_id -> stream_id of the last event the client received
+    resume_from: Optional[Dict[UUID, str]] = None
 
 
 class WSMessage(WSMessageBase):
-    action: str = "message"
+    action: Literal["message"] = "message"
     chat_id: UUID
     text: str = Field(..., min_length=1, max_length=1000)
 
 
+class WSPong(WSMessageBase):
+    action: Literal["pong"] = "pong"
+
+
 class WSPushNotificationS(WSMessageBase):
+    action: Literal["push_notification"] = "push_notification"
     message: str
+
+
+WSClientMessage = Annotated[
+    Union[WSSubscribe, WSMessage, WSPong], Field(discriminator="action")
+]
+
+# Validates raw JSON in one pass, picking the model by "action"
+ws_client_message_adapter = TypeAdapter(WSClientMessage)
@@ -5,6 +5,7 @@ from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app_api.main import app
+from shared.chat.partitions import ensure_message_partitions
 from shared.core.models import Base
 
 from .settings import host, port, test_db_url
@@ -19,6 +20,7 @@ async def test_engine():
     async with engine.begin() as conn:
         # создаём таблицы
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_message_partitions(conn)
 
     yield engine
 
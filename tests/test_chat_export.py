@@ -0,0 +1,170 @@
+import gzip
+import json
+import tracemalloc
+import uuid
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app_api.chat import router as chat_router
+from app_api.main import app
+from shared.auth.dependencies import get_current_user
+from shared.chat.services import ChatService
+from shared.chat.utils import encode_ndjson
+from shared.database import get_session
+from shared.users.schemas import UserSlimS
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+CHAT_ID = uuid.uuid4()
+USER_ID = uuid.uuid4()
+
+ExportRow = namedtuple("ExportRow", "id user_id username created_at content")
+
+
+class StreamResult:
+    def __init__(self, total: int, batch_size: int):
+        self.total = total
+        self.batch_size = batch_size
+
+    async def partitions(self):
+        for start in range(0, self.total, self.batch_size):
+            stop = min(start + self.batch_size, self.total)
+            yield [
+                ExportRow(
+                    uuid.UUID(int=i),
+                    USER_ID,
+                    "alice",
+                    START + timedelta(seconds=i),
+                    f"message {i}",
+                )
+                for i in range(start, stop)
+            ]
+
+
+class CursorSession:
+    """Generates the chat history lazily, like a server-side cursor."""
+
+    def __init__(self, total: int):
+        self.total = total
+
+    async def stream(self, stmt):
+        return StreamResult(self.total, stmt.get_execution_options()["yield_per"])
+
+
+async def export(total: int, compress: bool = False, batch_size: int = 1000):
+    batches = ChatService.stream_messages(CursorSession(total), CHAT_ID, batch_size)
+    async for chunk in encode_ndjson(batches, compress):
+        yield chunk
+
+
+async def test_export_writes_one_object_per_message_oldest_first():
+    body = b"".join([chunk async for chunk in export(2500)])
+    lines = body.decode().splitlines()
+
+    assert len(lines) == 2500
+    first, last = json.loads(lines[0]), json.loads(lines[-1])
+    assert first == {
+        "id": str(uuid.UUID(int=0)),
+        "user_id": str(USER_ID),
+        "username": "alice",
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "content": "message 0",
+    }
+    assert last["content"] == "message 2499"
+
+
+async def test_gzip_export_is_one_stream():
+    plain = b"".join([chunk async for chunk in export(2500)])
+    packed = b"".join([chunk async for chunk in export(2500, compress=True)])
+
+    assert gzip.decompress(packed) == plain
+    assert len(packed) < len(plain) / 5
+
+
+async def export_peak_memory(total: int, compress: bool) -> tuple[int, int]:
+    """Bytes exported and the peak of memory traced while exporting."""
+    exported = 0
+    tracemalloc.start()
+    try:
+        async for chunk in export(total, compress):
+            exported += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return exported, peak
+
+
+@pytest.mark.parametrize("compress", [False, True])
+async def test_export_memory_is_flat_in_chat_size(compress):
+    _, small_peak = await export_peak_memory(10_000, compress)
+    exported, large_peak = await export_peak_memory(100_000, compress)
+
+    # a few batches in flight whatever the size of the export
+    assert large_peak < small_peak * 1.5
+    if not compress:
+        assert large_peak < exported / 10
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    """The export endpoint on a chat of three messages, USER_ID a member."""
+
+    @asynccontextmanager
+    async def session_context():
+        yield CursorSession(3)
+
+    async def get_chat(session, chat_id):
+        return object()
+
+    async def get_chat_user(session, chat_id, user_id):
+        return object() if user_id == USER_ID else None
+
+    async def no_session():
+        yield None
+
+    monkeypatch.setattr(chat_router, "session_context", session_context)
+    monkeypatch.setattr(ChatService, "get_chat", staticmethod(get_chat))
+    monkeypatch.setattr(ChatService, "get_chat_user", staticmethod(get_chat_user))
+    app.dependency_overrides[get_session] = no_session
+    yield
+    app.dependency_overrides.pop(get_session)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+def log_in(user_id: uuid.UUID):
+    app.dependency_overrides[get_current_user] = lambda: UserSlimS(
+        id=user_id, username="alice", is_active=True, is_superuser=False
+    )
+
+
+async def test_export_needs_a_chat_member(endpoint):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        anonymous = await client.get(f"/api/chats/{CHAT_ID}/messages/export")
+        log_in(uuid.uuid4())
+        stranger = await client.get(f"/api/chats/{CHAT_ID}/messages/export")
+
+    assert anonymous.status_code == 401
+    assert stranger.status_code == 404
+
+
+async def test_export_endpoint(endpoint):
+    log_in(USER_ID)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        plain = await client.get(f"/api/chats/{CHAT_ID}/messages/export")
+        packed = await client.get(
+            f"/api/chats/{CHAT_ID}/messages/export", params={"gzip": True}
+        )
+
+    assert plain.status_code == 200
+    assert plain.headers["content-type"] == "application/x-ndjson"
+    assert f"chat-{CHAT_ID}.ndjson" in plain.headers["content-disposition"]
+    assert len(plain.text.splitlines()) == 3
+    assert packed.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(packed.content) == plain.content
@@ -0,0 +1,114 @@
+import uuid
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from shared.chat import cache as cache_module
+from shared.chat.cache import ChatMembersCache
+
+
+@pytest.fixture
+def members(monkeypatch):
+    """Chat members served instead of Postgres, with a counter of loads."""
+    chats = {}
+    loads = []
+
+    async def fake_load_members(self, chat_id):
+        loads.append(chat_id)
+        self.db_loads += 1
+        return frozenset(chats.get(chat_id, ()))
+
+    monkeypatch.setattr(
+        cache_module.ChatMembersCache, "_load_members", fake_load_members
+    )
+    return chats, loads
+
+
+@pytest.mark.asyncio
+async def test_membership_is_served_from_near_cache(members):
+    chats, loads = members
+    cache = ChatMembersCache(local_ttl_seconds=60)
+    chat_id, member, stranger = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    chats[chat_id] = {member}
+
+    assert await cache.is_member(chat_id, member)
+    assert not await cache.is_member(chat_id, stranger)
+    assert await cache.is_member(chat_id, member)
+
+    assert loads == [chat_id]
+    assert cache.stats()["local_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_members(members):
+    chats, loads = members
+    cache = ChatMembersCache(local_ttl_seconds=60)
+    chat_id, new_member = uuid.uuid4(), uuid.uuid4()
+    chats[chat_id] = set()
+
+    assert not await cache.is_member(chat_id, new_member)
+    chats[chat_id].add(new_member)
+    await cache.invalidate(chat_id)
+
+    assert await cache.is_member(chat_id, new_member)
+    assert loads == [chat_id, chat_id]
+
+
+@pytest.mark.asyncio
+async def test_near_cache_is_bounded(members):
+    cache = ChatMembersCache(local_ttl_seconds=60, local_max_size=2)
+
+    for _ in range(5):
+        await cache.get_members(uuid.uuid4())
+
+    assert cache.stats()["local_size"] == 2
+
+
+@pytest.fixture
+async def redis():
+    client = FakeRedis(decode_responses=True)
+    yield client
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_members_are_shared_through_redis(members, redis):
+    chats, loads = members
+    chat_id, member = uuid.uuid4(), uuid.uuid4()
+    chats[chat_id] = {member}
+    first, second = ChatMembersCache(), ChatMembersCache()
+    await first.connect(redis)
+    await second.connect(redis)
+
+    assert await first.is_member(chat_id, member)
+    assert await second.is_member(chat_id, member)
+
+    assert loads == [chat_id]
+    assert second.stats()["redis_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_during_load_is_not_undone(members, redis, monkeypatch):
+    chats, loads = members
+    chat_id, leaver = uuid.uuid4(), uuid.uuid4()
+    chats[chat_id] = {leaver}
+    cache = ChatMembersCache(local_ttl_seconds=60)
+    await cache.connect(redis)
+    load = cache_module.ChatMembersCache._load_members
+
+    async def load_then_leave(self, chat_id):
+        # the member leaves after Postgres was read, before the set is stored
+        members = await load(self, chat_id)
+        chats[chat_id].discard(leaver)
+        await self.invalidate(chat_id)
+        return members
+
+    monkeypatch.setattr(cache_module.ChatMembersCache, "_load_members", load_then_leave)
+    assert await cache.is_member(chat_id, leaver)
+    monkeypatch.setattr(cache_module.ChatMembersCache, "_load_members", load)
+
+    assert not await redis.exists(cache_module.members_key(chat_id))
+    assert not await cache.is_member(chat_id, leaver)
+    assert await redis.smembers(cache_module.members_key(chat_id)) == {
+        cache_module.EMPTY_MARKER
+    }
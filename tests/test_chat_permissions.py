@@ -0,0 +1,160 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app_api.main import app
+from shared.auth.dependencies import get_current_user
+from shared.chat.models import Chat, ChatType, ChatUser, Message
+from shared.chat.partitions import ensure_message_partitions
+from shared.chat.services import ChatService
+from shared.core.models import Base
+from shared.database import get_session
+from shared.users.models import User
+from shared.users.schemas import UserSlimS
+
+from .settings import test_db_url
+
+CHAT_ID = uuid.uuid4()
+USER = UserSlimS(
+    id=uuid.uuid4(),
+    username="alice",
+    is_active=True,
+    is_superuser=False,
+    token_version=0,
+)
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """A chat with the current user's membership set by the test."""
+    state = SimpleNamespace(
+        chat=SimpleNamespace(id=CHAT_ID, type=ChatType.GROUP),
+        chat_user=None,
+        deleted=False,
+    )
+
+    async def get_chat(session, chat_id):
+        return state.chat
+
+    async def get_chat_user(session, chat_id, user_id):
+        assert user_id == USER.id
+        return state.chat_user
+
+    async def delete_chat(session, chat):
+        state.deleted = True
+
+    async def no_session():
+        yield None
+
+    monkeypatch.setattr(ChatService, "get_chat", staticmethod(get_chat))
+    monkeypatch.setattr(ChatService, "get_chat_user", staticmethod(get_chat_user))
+    monkeypatch.setattr(ChatService, "delete_chat", staticmethod(delete_chat))
+    app.dependency_overrides[get_session] = no_session
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield state
+    app.dependency_overrides.pop(get_session)
+    app.dependency_overrides.pop(get_current_user)
+
+
+async def delete(chat_id=CHAT_ID):
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.delete(f"/api/chats/{chat_id}")
+
+
+async def test_delete_chat_requires_login():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.delete(f"/api/chats/{CHAT_ID}")
+
+    assert response.status_code == 401
+
+
+async def test_non_member_cannot_delete_chat(chat):
+    response = await delete()
+
+    assert response.status_code == 404
+    assert not chat.deleted
+
+
+async def test_group_member_cannot_delete_chat(chat):
+    chat.chat_user = SimpleNamespace(is_admin=False)
+
+    response = await delete()
+
+    assert response.status_code == 403
+    assert not chat.deleted
+
+
+async def test_group_admin_deletes_chat(chat):
+    chat.chat_user = SimpleNamespace(is_admin=True)
+
+    response = await delete()
+
+    assert response.status_code == 204
+    assert chat.deleted
+
+
+async def test_private_chat_member_deletes_chat(chat):
+    chat.chat.type = ChatType.PRIVATE
+    chat.chat_user = SimpleNamespace(is_admin=False)
+
+    response = await delete()
+
+    assert response.status_code == 204
+    assert chat.deleted
+
+
+async def test_deleting_a_chat_removes_its_members_and_messages():
+    engine = create_async_engine(test_db_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_message_partitions(conn)
+    except OSError:
+        await engine.dispose()
+        pytest.skip("test database is not reachable")
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        # commits in the service release a savepoint, the test rolls back
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint")
+        try:
+            user = User(
+                username=f"del_{uuid.uuid4().hex[:8]}",
+                email=f"{uuid.uuid4().hex[:8]}@example.com",
+                password="x",
+            )
+            chat = Chat(name="doomed", type=ChatType.GROUP)
+            session.add_all([user, chat])
+            await session.flush()
+            chat_id, user_id = chat.id, user.id
+            session.add(ChatUser(chat_id=chat_id, user_id=user_id, is_admin=True))
+            session.add_all(
+                Message(chat_id=chat_id, user_id=user_id, content=f"message {i}")
+                for i in range(3)
+            )
+            await session.commit()
+            session.expunge_all()
+
+            await ChatService.delete_chat(
+                session, await ChatService.get_chat(session, chat_id)
+            )
+
+            for model in (Message, ChatUser):
+                count = await session.scalar(
+                    select(func.count())
+                    .select_from(model)
+                    .where(model.chat_id == chat_id)
+                )
+                assert count == 0
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await engine.dispose()
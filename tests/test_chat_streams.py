@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+from fastapi.websockets import WebSocketState
+
+from app_ws.services import chat_ws_service
+from app_ws.ws_manager import ConnectionManager
+from shared import redis as redis_module
+from shared.redis import RedisChatStreams, chat_stream, stream_id_key
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.frames = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        self.frames.append(frame)
+        # A network send yields to the loop
+        await asyncio.sleep(0)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+class StreamPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def xrange(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+
+    async def execute(self):
+        return [await self.redis.xrange(*a, **kw) for a, kw in self.calls]
+
+
+class StreamRedis:
+    """XRANGE over in-memory streams and a Redis clock running ahead of ours."""
+
+    def __init__(self, clock_ahead_ms: int = 0):
+        self.streams = {}
+        self.clock_ahead_ms = clock_ahead_ms
+
+    def add(self, stream: str, count: int, first_ms: int = 1000):
+        entries = self.streams.setdefault(stream, [])
+        for i in range(count):
+            frame = json.dumps({"message": f"event {len(entries)}"})
+            entries.append((f"{first_ms + len(entries)}-0", {"data": frame}))
+
+    def pipeline(self, transaction=True):
+        return StreamPipeline(self)
+
+    async def xrange(self, stream, min, max, count):
+        entries = self.streams.get(stream, [])
+        if min != "-":
+            exclusive = min.startswith("(")
+            bound = stream_id_key(min.lstrip("("))
+            entries = [
+                e
+                for e in entries
+                if stream_id_key(e[0]) > bound
+                or (not exclusive and stream_id_key(e[0]) == bound)
+            ]
+        return entries[:count]
+
+    async def time(self):
+        now_us = int(time.time() * 1_000_000) + self.clock_ahead_ms * 1000
+        return now_us // 1_000_000, now_us % 1_000_000
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    manager = ConnectionManager(queue_high_water=256, slow_consumer_policy="close")
+    redis = StreamRedis()
+    monkeypatch.setattr(redis_module.redis_manager, "redis", redis)
+    monkeypatch.setattr(chat_ws_service, "manager", manager)
+    return manager, redis, RedisChatStreams(manager, replay_max=1000)
+
+
+async def wait_for_frames(ws, count: int):
+    for _ in range(1000):
+        if len(ws.frames) >= count:
+            return
+        await asyncio.sleep(0.001)
+
+
+async def test_replay_larger_than_the_queue_is_delivered(setup):
+    manager, redis, streams = setup
+    chat_id, ws = uuid.uuid4(), RecordingWebSocket()
+    await manager.connect(uuid.uuid4(), ws)
+    redis.add(chat_stream(chat_id), 301)
+
+    sent = await streams.replay(ws, chat_id, "1000-0")
+    await wait_for_frames(ws, 300)
+
+    assert sent == 300
+    assert ws.close_code is None
+    assert len(ws.frames) == 300
+    assert json.loads(ws.frames[-1])["stream_id"] == "1300-0"
+    assert manager.outbound_stats()["evicted_connections"] == 0
+
+
+async def test_gap_over_replay_max_asks_for_resync(setup):
+    manager, redis, streams = setup
+    streams.replay_max = 100
+    chat_id, ws = uuid.uuid4(), RecordingWebSocket()
+    await manager.connect(uuid.uuid4(), ws)
+    redis.add(chat_stream(chat_id), 200)
+
+    assert await streams.replay(ws, chat_id, "1000-0") == 0
+    await wait_for_frames(ws, 1)
+
+    assert [json.loads(f) for f in ws.frames] == [
+        {"action": "resync", "chat_id": str(chat_id)}
+    ]
+
+
+async def test_trimmed_stream_asks_for_resync(setup):
+    manager, redis, streams = setup
+    chat_id, ws = uuid.uuid4(), RecordingWebSocket()
+    await manager.connect(uuid.uuid4(), ws)
+    redis.add(chat_stream(chat_id), 10, first_ms=5000)
+
+    assert await streams.replay(ws, chat_id, "1000-0") == 0
+    await wait_for_frames(ws, 1)
+
+    assert json.loads(ws.frames[0])["action"] == "resync"
+
+
+async def test_new_streams_start_from_the_redis_clock(setup):
+    _, redis, streams = setup
+    redis.clock_ahead_ms = 60_000
+    chat_id = uuid.uuid4()
+
+    await streams.sync_clock()
+    streams.add_chat(chat_id)
+
+    start_ms = stream_id_key(streams.last_ids[chat_stream(chat_id)])[0]
+    assert abs(start_ms - (time.time() * 1000 + 60_000)) < 1000
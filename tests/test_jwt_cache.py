@@ -0,0 +1,43 @@
+import time
+
+import jwt
+import pytest
+
+from shared.auth.cache import VerifiedTokenCache, verified_token_cache
+from shared.auth.utils import create_access_token, decode_jwt_cached
+
+
+def test_cache_serves_claims_until_expiry():
+    cache = VerifiedTokenCache()
+    cache.set("token", {"sub": "alice", "exp": time.time() + 60})
+    assert cache.get("token")["sub"] == "alice"
+
+    cache.set("expired", {"sub": "bob", "exp": time.time() - 1})
+    assert cache.get("expired") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_is_bounded():
+    cache = VerifiedTokenCache(max_size=2)
+    exp = time.time() + 60
+    for token in ("a", "b", "c"):
+        cache.set(token, {"exp": exp})
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 2
+
+
+def test_verified_token_is_served_from_cache():
+    token = create_access_token({"sub": "alice"})
+
+    assert decode_jwt_cached(token)["sub"] == "alice"
+    assert decode_jwt_cached(token)["sub"] == "alice"
+    assert verified_token_cache.stats()["hits"] >= 1
+
+
+def test_tampered_token_is_not_served_from_cache():
+    token = create_access_token({"sub": "bob"})
+    decode_jwt_cached(token)
+    header, payload, signature = token.split(".")
+
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_jwt_cached(f"{header}.{payload}.{signature[:-4]}AAAA")
@@ -0,0 +1,107 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from shared.chat.services import ChatService
+from shared.chat.utils import decode_cursor, encode_cursor
+from shared.error.custom_exceptions import ValidationError
+from shared.users.models import User  # noqa: F401
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class KeysetSession:
+    """Runs the page query over an in-memory history ordered by (created_at, id)."""
+
+    def __init__(self, total: int):
+        self.rows = [
+            (
+                SimpleNamespace(
+                    id=uuid.UUID(int=i),
+                    user_id=uuid.UUID(int=0),
+                    created_at=START + timedelta(seconds=i // 2),
+                    content=f"message {i}",
+                ),
+                "alice",
+            )
+            for i in range(total)
+        ]
+
+    async def execute(self, query):
+        limit, before, after = query
+        key = lambda row: (row[0].created_at, row[0].id)  # noqa: E731
+        if after is not None:
+            rows = [r for r in self.rows if key(r) > decode_cursor(after)]
+        else:
+            rows = [
+                r for r in self.rows if not before or key(r) < decode_cursor(before)
+            ]
+            rows = rows[::-1]
+        return SimpleNamespace(all=lambda: rows[: limit + 1])
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(
+        ChatService,
+        "get_messages_page_stmt",
+        staticmethod(lambda chat_id, limit, before, after: (limit, before, after)),
+    )
+    return KeysetSession(total=25)
+
+
+def contents(page):
+    return [int(m.content.split()[1]) for m in page.messages]
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    message_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(START, message_id)) == (START, message_id)
+    for cursor in ("", "not-a-cursor", encode_cursor(START, message_id)[:-3]):
+        with pytest.raises(ValidationError):
+            decode_cursor(cursor)
+
+
+def test_page_query_is_keyset_ordered_and_bounded():
+    cursor = encode_cursor(START, uuid.uuid4())
+    stmt = ChatService.get_messages_page_stmt(uuid.uuid4(), 50, before=cursor)
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert "(messages.created_at, messages.id) < (" in sql
+    assert "ORDER BY messages.created_at DESC, messages.id DESC" in sql
+    assert "LIMIT" in sql and "OFFSET" not in sql
+
+
+async def test_walks_history_backwards_and_forwards(session):
+    chat_id = uuid.uuid4()
+
+    newest = await ChatService.get_messages_by_chat(session, chat_id, 10)
+    assert contents(newest) == list(range(15, 25))
+    assert newest.next_cursor is None
+
+    older = await ChatService.get_messages_by_chat(
+        session, chat_id, 10, before=newest.prev_cursor
+    )
+    oldest = await ChatService.get_messages_by_chat(
+        session, chat_id, 10, before=older.prev_cursor
+    )
+    assert contents(older) == list(range(5, 15))
+    assert contents(oldest) == list(range(0, 5))
+    assert oldest.prev_cursor is None
+
+    newer = await ChatService.get_messages_by_chat(
+        session, chat_id, 10, after=oldest.next_cursor
+    )
+    assert contents(newer) == list(range(5, 15))
+    assert newer.prev_cursor and newer.next_cursor
+
+
+async def test_rejects_both_directions(session):
+    cursor = encode_cursor(START, uuid.uuid4())
+    with pytest.raises(ValidationError):
+        await ChatService.get_messages_by_chat(
+            session, uuid.uuid4(), 10, before=cursor, after=cursor
+        )
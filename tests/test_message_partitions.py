@@ -0,0 +1,138 @@
+import uuid
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from shared.chat.models import Message
+from shared.chat.partitions import (
+    DEFAULT_PARTITION,
+    DEFAULT_PARTITION_DDL,
+    add_months,
+    ensure_message_partitions,
+    months_between,
+    moved_partition_ddl,
+    partition_ddl,
+    partition_name,
+)
+from shared.chat.services import ChatService
+from shared.chat.utils import encode_cursor
+from shared.users.models import User  # noqa: F401
+
+NOW = datetime(2026, 11, 15, 12, tzinfo=timezone.utc)
+
+
+class DDLConnection:
+    def __init__(self, existing: list[str]):
+        self.existing = existing
+        self.statements = []
+
+    async def exec_driver_sql(self, sql: str):
+        self.statements.append(sql)
+        return SimpleNamespace(
+            scalars=lambda: SimpleNamespace(all=lambda: self.existing)
+        )
+
+
+def compile_sql(stmt) -> str:
+    return str(
+        stmt.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_month_arithmetic_wraps_years():
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert list(months_between(date(2026, 11, 20), date(2027, 1, 1))) == [
+        date(2026, 11, 1),
+        date(2026, 12, 1),
+        date(2027, 1, 1),
+    ]
+
+
+def test_partition_covers_one_utc_month():
+    assert partition_name(date(2026, 12, 1)) == "messages_y2026m12"
+    assert partition_ddl(date(2026, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS messages_y2026m12 PARTITION OF messages "
+        "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')"
+    )
+
+
+def test_model_is_range_partitioned_on_created_at():
+    ddl = str(CreateTable(Message.__table__).compile(dialect=postgresql.dialect()))
+
+    assert "PRIMARY KEY (created_at, id)" in ddl
+    assert ddl.rstrip().endswith("PARTITION BY RANGE (created_at)")
+
+
+async def test_ensure_creates_only_missing_partitions():
+    conn = DDLConnection(existing=["messages_y2026m10", "messages_y2026m11"])
+
+    created = await ensure_message_partitions(conn, now=NOW, months_ahead=2)
+
+    assert created == ["messages_y2026m12", "messages_y2027m01", DEFAULT_PARTITION]
+    assert "pg_advisory_xact_lock" in conn.statements[1]
+    assert conn.statements[2:] == [
+        partition_ddl(date(2026, 12, 1)),
+        partition_ddl(date(2027, 1, 1)),
+        DEFAULT_PARTITION_DDL,
+    ]
+
+
+async def test_rows_in_the_default_partition_move_to_the_new_one():
+    existing = ["messages_y2026m10", "messages_y2026m11", DEFAULT_PARTITION]
+    conn = DDLConnection(existing=existing)
+
+    created = await ensure_message_partitions(conn, now=NOW, months_ahead=1)
+
+    assert created == ["messages_y2026m12"]
+    assert conn.statements[2:] == moved_partition_ddl(date(2026, 12, 1))
+    assert conn.statements[3] == (
+        "DELETE FROM messages_default WHERE "
+        "created_at >= '2026-12-01 00:00:00+00' AND "
+        "created_at < '2027-01-01 00:00:00+00'"
+    )
+
+
+async def test_ensure_skips_ddl_when_partitions_exist():
+    existing = [
+        "messages_y2026m10",
+        "messages_y2026m11",
+        "messages_y2026m12",
+        DEFAULT_PARTITION,
+    ]
+    conn = DDLConnection(existing=existing)
+
+    assert await ensure_message_partitions(conn, now=NOW, months_ahead=1) == []
+    assert len(conn.statements) == 1
+
+
+def test_cursor_pages_bound_created_at_for_pruning():
+    cursor = encode_cursor(NOW, uuid.UUID(int=1))
+
+    before = compile_sql(
+        ChatService.get_messages_page_stmt(uuid.uuid4(), 50, before=cursor)
+    )
+    after = compile_sql(
+        ChatService.get_messages_page_stmt(uuid.uuid4(), 50, after=cursor)
+    )
+
+    assert "messages.created_at <= '2026-11-15 12:00:00+00:00'" in before
+    assert "messages.created_at >= '2026-11-15 12:00:00+00:00'" in after
+
+
+def test_export_window_bounds_created_at():
+    sql = compile_sql(
+        ChatService.get_messages_export_stmt(
+            uuid.uuid4(),
+            1000,
+            since=datetime(2026, 10, 1, tzinfo=timezone.utc),
+            until=datetime(2026, 11, 1, tzinfo=timezone.utc),
+        )
+    )
+
+    assert "messages.created_at >= '2026-10-01 00:00:00+00:00'" in sql
+    assert "messages.created_at < '2026-11-01 00:00:00+00:00'" in sql
@@ -0,0 +1,82 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+
+from shared.chat import writer as writer_module
+from shared.chat.writer import MessageWriter
+from shared.error.custom_exceptions import IntegrityError
+from shared.users.models import User  # noqa: F401
+
+
+@pytest.fixture
+def inserts(monkeypatch):
+    """Record batches instead of hitting Postgres; chats in `bad_chats` fail."""
+    batches = []
+    bad_chats = set()
+
+    @asynccontextmanager
+    async def fake_session_context():
+        yield None
+
+    async def fake_create_messages(session, messages):
+        if any(m.chat_id in bad_chats for m in messages):
+            raise IntegrityError(message="Invalid chat_id or user_id")
+        batches.append(messages)
+
+    monkeypatch.setattr(writer_module, "session_context", fake_session_context)
+    monkeypatch.setattr(
+        writer_module.ChatService, "create_messages", fake_create_messages
+    )
+    return batches, bad_chats
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_one_insert(inserts):
+    batches, _ = inserts
+    message_writer = MessageWriter(max_batch_size=100, max_delay_ms=5)
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+
+    messages = await asyncio.gather(
+        *(message_writer.write(chat_id, user_id, f"m{i}") for i in range(20))
+    )
+
+    assert len(batches) == 1
+    assert [m.content for m in messages] == [f"m{i}" for i in range(20)]
+    assert all(m.id and m.created_at for m in messages)
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_by_size(inserts):
+    batches, _ = inserts
+    message_writer = MessageWriter(max_batch_size=8, max_delay_ms=1000)
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+
+    await asyncio.wait_for(
+        asyncio.gather(
+            *(message_writer.write(chat_id, user_id, "hi") for _ in range(20))
+        ),
+        timeout=0.5,
+    )
+
+    assert [len(batch) for batch in batches] == [8, 8, 4]
+
+
+@pytest.mark.asyncio
+async def test_invalid_message_fails_alone(inserts):
+    batches, bad_chats = inserts
+    message_writer = MessageWriter(max_batch_size=100, max_delay_ms=5)
+    good_chat, bad_chat, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    bad_chats.add(bad_chat)
+
+    results = await asyncio.gather(
+        message_writer.write(good_chat, user_id, "ok"),
+        message_writer.write(bad_chat, user_id, "bad"),
+        message_writer.write(good_chat, user_id, "ok"),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[1], IntegrityError)
+    assert results[0].content == results[2].content == "ok"
+    assert sum(len(batch) for batch in batches) == 2
@@ -0,0 +1,140 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from shared.auth.dependencies import get_current_user_by_refresh
+from shared.auth.services import AuthService
+from shared.auth.utils import (
+    create_access_token,
+    create_principal_claims,
+    decode_jwt_cached,
+    principal_from_claims,
+)
+from shared.error.custom_exceptions import CredentialError
+from shared.settings import settings
+from shared.users.cache import user_cache
+from shared.users.schemas import UserSlimS
+from shared.users.services import UserService
+
+
+def make_user(token_version: int = 0) -> UserSlimS:
+    return UserSlimS(
+        id=uuid.uuid4(),
+        username="alice",
+        is_active=True,
+        is_superuser=False,
+        token_version=token_version,
+    )
+
+
+def access_payload(user: UserSlimS) -> dict:
+    return {"type": "access", **create_principal_claims(user)}
+
+
+@pytest.fixture
+def principal_mode(monkeypatch):
+    monkeypatch.setattr(settings.jwt, "PRINCIPAL_CLAIMS", True)
+    yield
+    user_cache._users.clear()
+    user_cache._ids_by_username.clear()
+    user_cache._versions.clear()
+
+
+class VersionSession:
+    """Answers the token version query, counting the queries."""
+
+    def __init__(self, token_version: int):
+        self.token_version = token_version
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return SimpleNamespace(scalar_one_or_none=lambda: self.token_version)
+
+
+async def test_principal_comes_from_claims_after_one_version_query(principal_mode):
+    user = make_user()
+    session = VersionSession(token_version=0)
+
+    first = await AuthService.get_principal_by_token(session, access_payload(user))
+    second = await AuthService.get_principal_by_token(session, access_payload(user))
+
+    assert first == second == user
+    assert session.queries == 1
+    assert user_cache.get(user.id) is None
+    assert principal_from_claims({"sub": "alice"}) is None
+
+
+async def test_invalidated_user_is_checked_against_database(principal_mode):
+    user = make_user()
+    payload = access_payload(user)
+    session = VersionSession(token_version=0)
+    await AuthService.get_principal_by_token(session, payload)
+
+    # the user changed in another process
+    session.token_version = 1
+    await user_cache.invalidate(user.id)
+
+    with pytest.raises(CredentialError):
+        await AuthService.get_principal_by_token(session, payload)
+    assert session.queries == 2
+    # the current version is cached, the next request needs no query
+    assert user_cache.get_token_version(user.id) == 1
+
+
+async def test_outdated_token_version_is_rejected(principal_mode):
+    user = make_user()
+    payload = access_payload(user)
+    user_cache.set(user.model_copy(update={"token_version": 1}))
+
+    with pytest.raises(CredentialError):
+        await AuthService.get_principal_by_token(None, payload)
+
+
+async def test_token_without_claims_falls_back_to_lookup(monkeypatch):
+    user = make_user()
+
+    async def lookup(session, username):
+        assert username == "alice"
+        return user
+
+    monkeypatch.setattr(UserService, "get_slim_user_by_username", lookup)
+    payload = access_payload(user)
+
+    assert "uid" not in payload
+    assert await AuthService.get_principal_by_token(None, payload) == user
+
+
+async def test_token_without_claims_is_revoked_by_user_changes(monkeypatch):
+    user = make_user()
+    payload = decode_jwt_cached(create_access_token(create_principal_claims(user)))
+
+    async def lookup(session, username):
+        return user.model_copy(update={"token_version": 1})
+
+    monkeypatch.setattr(UserService, "get_slim_user_by_username", lookup)
+
+    # the claims come from the verified token cache, the version still counts
+    with pytest.raises(CredentialError):
+        await AuthService.get_principal_by_token(None, payload)
+
+
+async def test_outdated_refresh_token_is_rejected(monkeypatch):
+    user = SimpleNamespace(username="alice", token_version=1)
+
+    async def lookup(session, username):
+        return user
+
+    monkeypatch.setattr(UserService, "get_user_by_username", lookup)
+    monkeypatch.setattr(
+        "shared.auth.dependencies.decode_jwt_cached",
+        lambda token: {"type": "refresh", "sub": "alice", "ver": token},
+    )
+
+    def request(ver):
+        return SimpleNamespace(cookies={"refresh_token": ver})
+
+    assert await get_current_user_by_refresh(None, request(1)) is user
+    with pytest.raises(CredentialError):
+        await get_current_user_by_refresh(None, request(0))
@@ -0,0 +1,230 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from shared.auth.services import AuthService
+from shared.chat.partitions import add_months, ensure_message_partitions, month_start
+from shared.chat.services import ChatService
+from shared.core.models import Base
+from shared.error.custom_exceptions import NotFoundError
+
+from .settings import test_db_url
+
+SEED = [
+    """
+    INSERT INTO users (id, username, email, password, is_active, is_superuser)
+    SELECT gen_random_uuid(), 'plan_' || g, 'plan_' || g || '@example.com', 'x',
+           true, false
+    FROM generate_series(1, 4000) g
+    """,
+    """
+    INSERT INTO chats (id, name, type, created_at, updated_at)
+    SELECT gen_random_uuid(), 'plan_' || g, 'GROUP', now(), now()
+    FROM generate_series(1, 1000) g
+    """,
+    # every chat gets 8 members, every user sits in 2 chats
+    """
+    INSERT INTO chat_users (id, is_admin, chat_id, user_id)
+    SELECT gen_random_uuid(), false, c.id, u.id
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY id) % 500 AS bucket
+        FROM users WHERE username LIKE 'plan\\_%'
+    ) u
+    JOIN (
+        SELECT id, row_number() OVER (ORDER BY id) % 500 AS bucket
+        FROM chats WHERE name LIKE 'plan\\_%'
+    ) c ON c.bucket = u.bucket
+    """,
+    """
+    INSERT INTO messages (id, chat_id, user_id, content, created_at)
+    SELECT gen_random_uuid(), cu.chat_id, cu.user_id, 'message ' || g,
+           now() - g * interval '1 second'
+    FROM (
+        SELECT DISTINCT ON (chat_id) chat_id, user_id FROM chat_users
+    ) cu
+    CROSS JOIN generate_series(1, 100) g
+    """,
+    """
+    INSERT INTO email_verifications (id, user_id, token_hash, expires_at, sent_at,
+                                     is_used)
+    SELECT gen_random_uuid(), id, encode(sha256(convert_to(username, 'UTF8')), 'hex'),
+           now(), now(), false
+    FROM users WHERE username LIKE 'plan\\_%'
+    """,
+    "ANALYZE users, chats, chat_users, messages, email_verifications",
+]
+
+
+class PlanResult:
+    """Stands in for the query result so the services run to completion."""
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+    def first(self):
+        return None
+
+    def scalar_one_or_none(self):
+        return None
+
+
+class ExplainSession:
+    """Runs EXPLAIN instead of every statement a service executes."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.plans: list[dict] = []
+
+    async def execute(self, stmt):
+        connection = await self.session.connection()
+        sql = stmt.compile(
+            dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+        )
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        self.plans.append(plan[0]["Plan"])
+        return PlanResult()
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def used_indexes(plan: dict) -> set[str]:
+    return {node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node}
+
+
+def seq_scanned(plan: dict) -> set[str]:
+    return {
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if node["Node Type"] == "Seq Scan"
+    }
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def seeded_session():
+    engine = create_async_engine(test_db_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    await conn.run_sync(index.create, checkfirst=True)
+            await ensure_message_partitions(conn)
+    except OSError:
+        await engine.dispose()
+        pytest.skip("test database is not reachable")
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        for statement in SEED:
+            await conn.execute(text(statement))
+        session = AsyncSession(bind=conn)
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await engine.dispose()
+
+
+async def seeded_ids(session: AsyncSession, sql: str) -> list[uuid.UUID]:
+    result = await session.execute(text(sql))
+    return list(result.scalars().all())
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_message_history_uses_chat_created_at_index(seeded_session):
+    [chat_id] = await seeded_ids(seeded_session, "SELECT chat_id FROM messages LIMIT 1")
+    explain = ExplainSession(seeded_session)
+
+    await ChatService.get_messages_by_chat(explain, chat_id, limit=50)
+
+    [plan] = explain.plans
+    # each partition has its own copy of ix_messages_chat_id_created_at_id
+    assert any(
+        name.startswith("messages_") and name.endswith("_chat_id_created_at_id_idx")
+        for name in used_indexes(plan)
+    )
+    assert not any(name.startswith("messages") for name in seq_scanned(plan))
+    # the partitions are appended in order and the index yields rows in page order
+    assert not any(node["Node Type"] == "Sort" for node in plan_nodes(plan))
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_export_window_prunes_other_partitions(seeded_session):
+    [chat_id] = await seeded_ids(seeded_session, "SELECT chat_id FROM messages LIMIT 1")
+    current = month_start(datetime.now(timezone.utc))
+    since = datetime.combine(current, datetime.min.time(), timezone.utc)
+    until = datetime.combine(add_months(current, 1), datetime.min.time(), timezone.utc)
+    explain = ExplainSession(seeded_session)
+
+    await explain.execute(
+        ChatService.get_messages_export_stmt(chat_id, 1000, since=since, until=until)
+    )
+
+    [plan] = explain.plans
+    scanned = {
+        node["Relation Name"]
+        for node in plan_nodes(plan)
+        if node.get("Relation Name", "").startswith("messages")
+    }
+    assert scanned == {f"messages_y{current.year}m{current.month:02d}"}
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_user_chat_ids_in_list_uses_user_index(seeded_session):
+    [user_id] = await seeded_ids(
+        seeded_session, "SELECT user_id FROM chat_users LIMIT 1"
+    )
+    chat_ids = await seeded_ids(seeded_session, "SELECT id FROM chats LIMIT 20")
+    explain = ExplainSession(seeded_session)
+
+    await ChatService.get_user_chat_ids_in_list(
+        explain, type("U", (), {"id": user_id}), chat_ids
+    )
+
+    [plan] = explain.plans
+    assert "ix_chat_users_user_id_chat_id" in used_indexes(plan)
+    assert not seq_scanned(plan)
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_private_chat_lookup_starts_from_user_index(seeded_session):
+    user_one, user_two = await seeded_ids(
+        seeded_session, "SELECT user_id FROM chat_users LIMIT 2"
+    )
+    explain = ExplainSession(seeded_session)
+
+    await ChatService.get_private_chat(
+        explain, type("U", (), {"id": user_one}), type("U", (), {"id": user_two})
+    )
+
+    [plan] = explain.plans
+    assert "ix_chat_users_user_id_chat_id" in used_indexes(plan)
+    assert "chat_users" not in seq_scanned(plan)
+
+
+@pytest.mark.asyncio(loop_scope="module")
+async def test_email_verification_lookup_uses_token_index(seeded_session):
+    explain = ExplainSession(seeded_session)
+
+    with pytest.raises(NotFoundError):
+        await AuthService.get_email_verification_by_token(explain, "token")
+
+    [plan] = explain.plans
+    assert "ix_email_verifications_token_hash" in used_indexes(plan)
+    assert not seq_scanned(plan)
@@ -0,0 +1,101 @@
+import uuid
+
+import pytest
+from fakeredis.aioredis import FakeRedis
+
+from app_ws.rate_limit import Limit, RateLimiter, TokenBucket
+
+
+class FakeScript:
+    def __init__(self, retry_after_ms: int = 0, error: Exception | None = None):
+        self.retry_after_ms = retry_after_ms
+        self.error = error
+        self.calls = []
+
+    async def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        if self.error:
+            raise self.error
+        return self.retry_after_ms
+
+
+def make_limiter(script: FakeScript | None = None) -> RateLimiter:
+    limiter = RateLimiter(
+        limits={
+            "connection": {"message": Limit(rate=10, burst=3)},
+            "user": {"message": Limit(rate=20, burst=5)},
+        },
+        enabled=True,
+    )
+    limiter._script = script
+    return limiter
+
+
+def test_bucket_allows_burst_then_reports_retry_after():
+    bucket = TokenBucket(Limit(rate=10, burst=3))
+
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.1, abs=0.01)
+
+
+async def test_connection_limit_is_checked_before_redis():
+    script = FakeScript()
+    limiter = make_limiter(script)
+    buckets = limiter.connection_buckets()
+    user_id = uuid.uuid4()
+
+    results = [await limiter.hit(user_id, "message", buckets) for _ in range(4)]
+
+    assert results[:3] == [0.0, 0.0, 0.0] and results[3] > 0
+    assert len(script.calls) == 3
+    keys, args = script.calls[0]
+    assert keys == [f"rate_limit:message:{user_id}"]
+    assert args == [20, 5, 1]
+    assert limiter.stats()["limited"] == {"message": 1}
+
+
+async def test_user_limit_comes_from_redis():
+    limiter = make_limiter(FakeScript(retry_after_ms=250))
+
+    retry_after = await limiter.hit(
+        uuid.uuid4(), "message", limiter.connection_buckets()
+    )
+
+    assert retry_after == 0.25
+
+
+async def test_redis_errors_fall_back_to_connection_limit():
+    limiter = make_limiter(FakeScript(error=ConnectionError("down")))
+
+    assert await limiter.hit(uuid.uuid4(), "message", {}) == 0.0
+    assert await limiter.hit(uuid.uuid4(), "subscribe", {}) == 0.0
+
+
+async def test_redis_denial_refunds_the_connection_token():
+    limiter = make_limiter(FakeScript(retry_after_ms=250))
+    buckets = limiter.connection_buckets()
+
+    for _ in range(5):
+        assert await limiter.hit(uuid.uuid4(), "message", buckets) == 0.25
+
+    assert buckets["message"].tokens == pytest.approx(3, abs=0.01)
+
+
+async def test_user_bucket_is_shared_on_the_redis_clock():
+    redis = FakeRedis(decode_responses=True)
+    limiter = make_limiter()
+    await limiter.connect(redis)
+    user_id = uuid.uuid4()
+
+    # two connections of one user draw from the same burst of 5
+    first, second = limiter.connection_buckets(), limiter.connection_buckets()
+    results = [
+        await limiter.hit(user_id, "message", buckets)
+        for buckets in (first, second, first, second, first, second)
+    ]
+
+    assert results[:5] == [0.0] * 5
+    # one token at 20/s, less what refilled while the test ran
+    assert 0 < results[5] <= 0.05
+    assert await redis.hget(f"rate_limit:message:{user_id}", "ts")
+    await redis.aclose()
@@ -0,0 +1,187 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+from shared.chat import services as services_module
+from shared.chat.cache import RecentMessagesCache, recent_key, recent_primed_key
+from shared.chat.schemas import MessageInfoS
+from shared.chat.services import ChatService
+from shared.chat.utils import decode_cursor
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+CHAT_ID = uuid.uuid4()
+
+
+def message(i: int) -> MessageInfoS:
+    return MessageInfoS(
+        id=uuid.UUID(int=i),
+        user_id=uuid.UUID(int=0),
+        username="alice",
+        created_at=START + timedelta(seconds=i),
+        content=f"message {i}",
+    )
+
+
+class HistorySession:
+    """Serves the newest-first page query from a list, counting the queries."""
+
+    def __init__(self, messages: list[MessageInfoS]):
+        self.messages = messages
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        limit, before, after = query
+        rows = [
+            m for m in self.messages if not before or m.id < decode_cursor(before)[1]
+        ]
+        rows = [(SimpleNamespace(**m.model_dump()), m.username) for m in rows[::-1]]
+        return SimpleNamespace(all=lambda: rows[: limit + 1])
+
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+
+@pytest.fixture
+async def cache(monkeypatch, server):
+    cache = RecentMessagesCache(size=20, local_ttl_seconds=60)
+    # fakeredis runs the prime script with a real Lua interpreter
+    await cache.connect(FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(services_module, "recent_messages_cache", cache)
+    monkeypatch.setattr(
+        ChatService,
+        "get_messages_page_stmt",
+        staticmethod(lambda chat_id, limit, before, after: (limit, before, after)),
+    )
+    return cache
+
+
+def contents(page):
+    return [int(m.content.split()[1]) for m in page.messages]
+
+
+async def test_newest_page_is_served_without_the_database(cache):
+    session = HistorySession([message(i) for i in range(30)])
+
+    first = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+    cache._local.clear()
+    from_redis = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+    from_local = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    assert session.queries == 1
+    assert contents(first) == contents(from_redis) == contents(from_local)
+    assert contents(first) == list(range(20, 30))
+    assert from_redis.prev_cursor == first.prev_cursor
+    assert from_redis.next_cursor is None
+    assert cache.stats() == {
+        "local_size": 1,
+        "local_hits": 1,
+        "redis_hits": 1,
+        "misses": 1,
+        "hit_ratio": 0.6667,
+        "pushes": 0,
+    }
+
+
+async def test_push_appends_and_trims_the_ring(cache):
+    session = HistorySession([message(i) for i in range(5)])
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    for i in range(5, 30):
+        await cache.push(CHAT_ID, message(i))
+    page = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    assert session.queries == 1
+    assert contents(page) == list(range(20, 30))
+    assert len(await cache.get(CHAT_ID)) == 20
+    assert await cache.redis.llen(recent_key(CHAT_ID)) == 20
+
+
+async def test_short_chat_has_no_older_cursor(cache):
+    session = HistorySession([message(i) for i in range(3)])
+
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+    page = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    assert contents(page) == [0, 1, 2]
+    assert page.prev_cursor is None
+
+
+async def test_pushes_before_priming_are_kept(cache):
+    session = HistorySession([message(i) for i in range(10)])
+    # Written after the history was read, pushed before it was primed
+    await cache.push(CHAT_ID, message(10))
+
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=5)
+    cache._local.clear()
+    page = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=5)
+
+    assert contents(page) == [6, 7, 8, 9, 10]
+
+
+async def test_cursor_pages_and_large_pages_skip_the_cache(cache):
+    session = HistorySession([message(i) for i in range(30)])
+    first = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    older = await ChatService.get_messages_by_chat(
+        session, CHAT_ID, limit=10, before=first.prev_cursor
+    )
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=25)
+
+    assert contents(older) == list(range(10, 20))
+    assert session.queries == 3
+
+
+async def test_redis_errors_fall_back_to_the_database(cache, server):
+    session = HistorySession([message(i) for i in range(30)])
+    server.connected = False
+
+    page = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+    await cache.push(CHAT_ID, message(30))
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=10)
+
+    assert contents(page) == list(range(20, 30))
+    assert session.queries == 2
+    assert cache.stats()["pushes"] == 0
+
+
+async def test_failed_push_drops_the_buffer(cache):
+    session = HistorySession([message(i) for i in range(10)])
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=5)
+    # RPUSH fails on a key of the wrong type
+    await cache.redis.set(recent_key(CHAT_ID), "not a list")
+
+    await cache.push(CHAT_ID, message(10))
+
+    assert not await cache.redis.exists(recent_primed_key(CHAT_ID))
+    assert await cache.get(CHAT_ID) is None
+
+
+async def test_messages_pushed_twice_are_read_once(cache):
+    session = HistorySession([message(i) for i in range(10)])
+    await ChatService.get_messages_by_chat(session, CHAT_ID, limit=5)
+
+    await cache.push(CHAT_ID, message(10))
+    await cache.push(CHAT_ID, message(10))
+    page = await ChatService.get_messages_by_chat(session, CHAT_ID, limit=5)
+
+    assert contents(page) == [6, 7, 8, 9, 10]
+
+
+async def test_priming_keeps_pushes_that_postgres_missed(cache):
+    await cache.push(CHAT_ID, message(9))
+    await cache.push(CHAT_ID, message(10))
+
+    await cache.prime(CHAT_ID, [message(i) for i in range(10)])
+    # a second prime is a no-op
+    await cache.prime(CHAT_ID, [message(0)])
+
+    messages = await cache.get(CHAT_ID)
+    assert [m.content for m in messages] == [f"message {i}" for i in range(11)]
+    assert await cache.redis.llen(recent_key(CHAT_ID)) == 11
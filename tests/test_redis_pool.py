@@ -0,0 +1,18 @@
+import aioredis
+
+from shared.redis import RedisManager
+
+
+async def test_commands_and_listeners_get_separate_blocking_pools():
+    manager = RedisManager(
+        "redis://localhost", max_connections=7, pubsub_max_connections=3, pool_timeout=2
+    )
+    await manager.connect()
+    try:
+        pools = manager.redis.connection_pool, manager.pubsub_redis.connection_pool
+
+        assert all(isinstance(p, aioredis.BlockingConnectionPool) for p in pools)
+        assert [p.max_connections for p in pools] == [7, 3]
+        assert all(p.timeout == 2 for p in pools)
+    finally:
+        await manager.close()
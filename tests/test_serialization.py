@@ -0,0 +1,32 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app_ws.ws_manager import encode_json
+from shared.chat.models import ChatType
+from shared.chat.schemas import ChatS
+from shared.core.serialization import FastJSONResponse, dumps, loads
+
+
+def test_native_types_match_json_encoding():
+    chat = ChatS(
+        id=uuid.uuid4(),
+        name="чат",
+        description=None,
+        type=ChatType.GROUP,
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc),
+    )
+
+    # Same output the default JSONResponse produced via jsonable_encoder
+    assert loads(dumps([chat])) == jsonable_encoder([chat])
+    assert loads(FastJSONResponse({chat.id: chat.type}).body) == {str(chat.id): "group"}
+
+
+def test_ws_frames_keep_send_json_format():
+    data = {"message": "привет", "n": 1}
+    assert encode_json(data) == json.dumps(
+        data, separators=(",", ":"), ensure_ascii=False
+    )
@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+from shared.users.cache import UserCache
+from shared.users.schemas import UserSlimS
+
+
+def make_user(username: str) -> UserSlimS:
+    return UserSlimS(
+        id=uuid.uuid4(), username=username, is_active=True, is_superuser=False
+    )
+
+
+def test_lookup_by_id_and_username_counts_hits_and_misses():
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    user = make_user("alice")
+
+    assert cache.get(user.id) is None
+    cache.set(user)
+
+    assert cache.get(user.id) == user
+    assert cache.get_by_username("alice") == user
+    assert cache.get_by_username("bob") is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_user_is_evicted():
+    cache = UserCache(max_size=2, ttl_seconds=60)
+    first, second, third = make_user("a"), make_user("b"), make_user("c")
+    cache.set(first)
+    cache.set(second)
+    cache.get(first.id)
+
+    cache.set(third)
+
+    assert cache.get(second.id) is None
+    assert cache.get_by_username("b") is None
+    assert cache.get(first.id) == first
+    assert cache.get(third.id) == third
+
+
+def test_expired_user_is_a_miss():
+    cache = UserCache(max_size=10, ttl_seconds=-1)
+    user = make_user("alice")
+    cache.set(user)
+
+    assert cache.get(user.id) is None
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_user_and_its_username():
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    user = make_user("alice")
+    cache.set(user)
+
+    await cache.invalidate(user.id)
+
+    assert cache.get(user.id) is None
+    assert cache.get_by_username("alice") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_token_version_is_cached_apart_from_the_user():
+    cache = UserCache(max_size=10, ttl_seconds=60)
+    cached, other = make_user("alice"), make_user("bob")
+    cache.set(cached)
+    cache.set_token_version(other.id, 3)
+
+    assert cache.get_token_version(cached.id) == 0
+    assert cache.get_token_version(other.id) == 3
+    assert cache.get(other.id) is None
+
+    await cache.invalidate(other.id)
+
+    assert cache.get_token_version(other.id) is None
@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.websockets import WebSocketState
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app_ws import router as ws_router
+from app_ws.ws_manager import manager
+from shared.auth.services import AuthService
+from shared.auth.utils import create_access_token
+from shared.users.schemas import UserSlimS
+
+from .settings import test_db_url
+
+
+class ClientWebSocket:
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.scope = {"subprotocols": []}
+        self.incoming = asyncio.Queue()
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive_text(self):
+        data = await self.incoming.get()
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    async def send_text(self, frame: str):
+        self.frames.append(frame)
+
+    async def close(self, code: int = 1000):
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+async def test_open_sockets_hold_no_database_session(monkeypatch):
+    engine = create_async_engine(test_db_url, pool_size=5, max_overflow=0)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except OSError:
+        await engine.dispose()
+        pytest.skip("test database is not reachable")
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session_context():
+        async with async_session() as session:
+            yield session
+
+    users = {}
+    peak = 0
+
+    async def get_principal(session, payload):
+        nonlocal peak
+        await session.execute(text("SELECT 1"))
+        peak = max(peak, engine.pool.checkedout())
+        return users[payload["sub"]]
+
+    monkeypatch.setattr(ws_router, "session_context", session_context)
+    monkeypatch.setattr(AuthService, "get_principal_by_token", get_principal)
+
+    sockets, tasks = [], []
+    for i in range(20):
+        user = UserSlimS(
+            id=uuid.uuid4(), username=f"user{i}", is_active=True, is_superuser=False
+        )
+        users[user.username] = user
+        ws = ClientWebSocket()
+        token = create_access_token({"sub": user.username})
+        tasks.append(
+            asyncio.create_task(
+                ws_router.websocket_chat(ws, token=token, batch=False, heartbeat=False)
+            )
+        )
+        sockets.append((user, ws))
+
+    while len(manager.active_connections) < 20:
+        await asyncio.sleep(0.001)
+
+    try:
+        # 20 idle sockets on a 5 connection pool: none of them may keep one
+        assert peak >= 1
+        assert engine.pool.checkedout() == 0
+        assert all(ws.client_state == WebSocketState.CONNECTED for _, ws in sockets)
+    finally:
+        for _, ws in sockets:
+            ws.incoming.put_nowait(WebSocketDisconnect())
+        await asyncio.gather(*tasks)
+        await engine.dispose()
+    assert not manager.active_connections
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import uuid
+
+from app_ws.protocols import MSGPACK_PROTOCOL, unpack
+from app_ws.ws_manager import ConnectionManager
+from tests.test_ws_manager import RecordingWebSocket
+from tests.test_ws_protocols import BinaryWebSocket
+
+
+async def burst(manager: ConnectionManager, chat_id: uuid.UUID, events: int):
+    for i in range(events):
+        await manager.broadcast_json_to_chat(chat_id, {"n": i})
+    await asyncio.sleep(0.05)
+
+
+async def test_burst_is_coalesced_into_batch_frames():
+    manager = ConnectionManager(batch_max_delay_ms=10, batch_max_size=4)
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+    batched, plain = RecordingWebSocket(), RecordingWebSocket()
+    await manager.connect(user_id, batched, batch=True)
+    await manager.connect(user_id, plain)
+    manager.subscribe_to_chat(user_id, chat_id)
+
+    await burst(manager, chat_id, 6)
+
+    assert len(plain.frames) == 6
+    assert [json.loads(frame) for frame in batched.frames] == [
+        {"action": "batch", "events": [{"n": 0}, {"n": 1}, {"n": 2}, {"n": 3}]},
+        {"action": "batch", "events": [{"n": 4}, {"n": 5}]},
+    ]
+    assert manager.outbound_stats()["batched_events"] == 6
+    # Every event in a batch counts towards the chat's delivery latency
+    assert len(manager.chat_latencies[chat_id]) == 12
+
+
+async def test_single_event_is_not_wrapped():
+    manager = ConnectionManager(batch_max_delay_ms=5)
+    user_id = uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws, batch=True)
+
+    await manager.send_json_to_user(user_id, {"n": 1})
+    await asyncio.sleep(0.03)
+
+    assert ws.frames == ['{"n":1}']
+
+
+async def test_msgpack_batch_frame():
+    manager = ConnectionManager(batch_max_delay_ms=10)
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+    ws = BinaryWebSocket()
+    await manager.connect(user_id, ws, subprotocol=MSGPACK_PROTOCOL, batch=True)
+    manager.subscribe_to_chat(user_id, chat_id)
+
+    await burst(manager, chat_id, 3)
+
+    assert [unpack(frame) for frame in ws.frames] == [
+        {"action": "batch", "events": [{"n": 0}, {"n": 1}, {"n": 2}]}
+    ]
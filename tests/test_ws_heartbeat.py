@@ -0,0 +1,107 @@
+import asyncio
+import time
+import uuid
+
+from fastapi.websockets import WebSocketState
+
+from app_ws import router as ws_router
+from app_ws.ws_manager import ConnectionManager, manager
+from shared.users.schemas import UserSlimS
+from tests.test_ws_auth import ClientWebSocket
+from tests.test_ws_manager import RecordingWebSocket, StalledWebSocket
+
+
+async def test_silent_socket_is_pinged_then_reaped():
+    manager = ConnectionManager(ping_interval=10, idle_timeout=30)
+    user_id, chat_id = uuid.uuid4(), uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws, heartbeat=True)
+    manager.subscribe_to_chat(user_id, chat_id)
+    outbound = manager.outbound_queues[ws]
+
+    outbound.last_seen = time.monotonic() - 15
+    assert manager.reap() == 0
+    assert manager.reap() == 0
+    await asyncio.sleep(0.01)
+    assert ws.frames == ['{"action":"ping"}']
+
+    outbound.last_seen = time.monotonic() - 31
+    assert manager.reap() == 1
+    await asyncio.sleep(0.01)
+
+    assert ws.close_code == 1001
+    assert user_id not in manager.active_connections
+    assert chat_id not in manager.chat_subscriptions
+    assert manager.outbound_stats()["reaped_connections"] == 1
+
+
+async def test_silent_socket_without_heartbeat_is_left_to_protocol_pings():
+    manager = ConnectionManager(ping_interval=10, idle_timeout=30)
+    user_id = uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws)
+    manager.outbound_queues[ws].last_seen = time.monotonic() - 31
+
+    assert manager.reap() == 0
+    await asyncio.sleep(0.01)
+
+    assert ws.frames == []
+    assert ws.close_code is None
+    manager.disconnect(ws, user_id)
+
+
+async def test_reaping_stops_the_handler_waiting_in_receive(monkeypatch):
+    user = UserSlimS(
+        id=uuid.uuid4(), username="alice", is_active=True, is_superuser=False
+    )
+
+    async def authenticate(token):
+        return user
+
+    monkeypatch.setattr(ws_router, "authenticate_websocket", authenticate)
+    ws = ClientWebSocket()
+    handler = asyncio.create_task(
+        ws_router.websocket_chat(ws, token="token", batch=False, heartbeat=True)
+    )
+    while ws not in manager.outbound_queues:
+        await asyncio.sleep(0.001)
+    manager.outbound_queues[ws].last_seen = time.monotonic() - manager.idle_timeout
+
+    assert manager.reap() == 1
+    # the client never sends anything, the handler returns all the same
+    await asyncio.wait_for(handler, timeout=1)
+
+    assert ws.client_state == WebSocketState.DISCONNECTED
+    assert user.id not in manager.active_connections
+
+
+async def test_touched_socket_is_kept():
+    manager = ConnectionManager(ping_interval=10, idle_timeout=30)
+    user_id = uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws, heartbeat=True)
+    manager.outbound_queues[ws].last_seen = time.monotonic() - 31
+
+    manager.touch(ws)
+
+    assert manager.reap() == 0
+    assert ws in manager.outbound_queues
+    manager.disconnect(ws, user_id)
+
+
+async def test_reaping_reports_reclaimed_frames():
+    manager = ConnectionManager(idle_timeout=30, send_timeout=0.05)
+    user_id = uuid.uuid4()
+    ws = StalledWebSocket()
+    await manager.connect(user_id, ws)
+    for i in range(5):
+        await manager.send_json_to_user(user_id, {"n": i})
+    await asyncio.sleep(0.01)
+    ws.client_state = ws.client_state.DISCONNECTED
+
+    assert manager.reap() == 1
+
+    stats = manager.outbound_stats()
+    assert stats["reclaimed_frames"] == 4
+    assert stats["reclaimed_bytes"] > 0
+    assert not manager.outbound_queues
@@ -0,0 +1,244 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi.websockets import WebSocketState
+
+from app_ws.ws_manager import ConnectionManager
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.frames = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        self.frames.append(frame)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+class StalledWebSocket(RecordingWebSocket):
+    async def send_text(self, frame: str):
+        await asyncio.sleep(3600)
+
+
+async def drain(manager: ConnectionManager):
+    while any(q.frames.qsize() for q in manager.outbound_queues.values()):
+        await asyncio.sleep(0.001)
+    await asyncio.sleep(0.001)
+
+
+def populate(manager: ConnectionManager, total_chats: int):
+    for _ in range(total_chats):
+        manager.subscribe_to_chat(uuid.uuid4(), uuid.uuid4())
+
+
+def measure_disconnect(manager: ConnectionManager, user_chats: int, rounds: int = 50):
+    """Best-of-N time of a user's last socket disconnecting."""
+    best = float("inf")
+    user_id = uuid.uuid4()
+    chat_ids = [uuid.uuid4() for _ in range(user_chats)]
+    for _ in range(rounds):
+        ws = object()
+        manager.active_connections[user_id] = {ws}
+        for chat_id in chat_ids:
+            manager.subscribe_to_chat(user_id, chat_id)
+
+        start = time.perf_counter()
+        manager.disconnect(ws, user_id)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_subscribe_unsubscribe_keeps_indexes_in_sync():
+    manager = ConnectionManager()
+    user_id, other_id, chat_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    manager.subscribe_to_chat(user_id, chat_id)
+    manager.subscribe_to_chat(other_id, chat_id)
+    assert manager.chat_subscriptions[chat_id] == {user_id, other_id}
+    assert manager.user_subscriptions[user_id] == {chat_id}
+
+    manager.unsubscribe_from_chat(user_id, chat_id)
+    assert manager.chat_subscriptions[chat_id] == {other_id}
+    assert user_id not in manager.user_subscriptions
+
+    manager.unsubscribe_from_chat(other_id, chat_id)
+    assert chat_id not in manager.chat_subscriptions
+    assert not manager.user_subscriptions
+
+
+def test_disconnect_removes_only_own_subscriptions():
+    manager = ConnectionManager()
+    populate(manager, 100)
+    user_id, chat_id = uuid.uuid4(), uuid.uuid4()
+    ws = object()
+    manager.active_connections[user_id] = {ws}
+    manager.subscribe_to_chat(user_id, chat_id)
+
+    manager.disconnect(ws, user_id)
+
+    assert chat_id not in manager.chat_subscriptions
+    assert user_id not in manager.user_subscriptions
+    assert len(manager.chat_subscriptions) == 100
+
+
+def test_disconnect_cost_is_flat_in_total_chats():
+    small, large = ConnectionManager(), ConnectionManager()
+    populate(small, 1_000)
+    populate(large, 200_000)
+
+    small_time = measure_disconnect(small, user_chats=20)
+    large_time = measure_disconnect(large, user_chats=20)
+
+    # A scan over every chat would be ~200x slower here
+    assert large_time < small_time * 10, (
+        f"disconnect: 1k chats {small_time * 1e6:.1f}us, "
+        f"200k chats {large_time * 1e6:.1f}us"
+    )
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_payload_once():
+    manager = ConnectionManager()
+    chat_id = uuid.uuid4()
+    sockets = []
+    for _ in range(5):
+        user_id = uuid.uuid4()
+        for ws in (RecordingWebSocket(), RecordingWebSocket()):
+            await manager.connect(user_id, ws)
+            sockets.append(ws)
+        manager.subscribe_to_chat(user_id, chat_id)
+
+    result = await manager.broadcast_json_to_chat(chat_id, {"message": "привет"})
+    await drain(manager)
+
+    assert result.delivered == 10
+    frames = [frame for ws in sockets for frame in ws.frames]
+    assert len(frames) == 10
+    assert frames[0] == '{"message":"привет"}'
+    assert all(frame is frames[0] for frame in frames)
+
+
+@pytest.mark.asyncio
+async def test_delivery_latency_is_reported_per_chat():
+    manager = ConnectionManager()
+    chat_id, other_chat = uuid.uuid4(), uuid.uuid4()
+    user_id = uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws)
+    manager.subscribe_to_chat(user_id, chat_id)
+    manager.subscribe_to_chat(user_id, other_chat)
+
+    for i in range(10):
+        await manager.broadcast_json_to_chat(chat_id, {"n": i})
+    await manager.broadcast_json_to_chat(other_chat, {"n": 0})
+    await manager.send_json_to_user(user_id, {"action": "direct"})
+    await drain(manager)
+
+    stats = manager.outbound_stats()["chat_send_latency"]
+    assert set(stats) == {str(chat_id), str(other_chat)}
+    assert len(manager.chat_latencies[chat_id]) == 10
+    assert 0 <= stats[str(chat_id)]["p50"] <= stats[str(chat_id)]["p99"]
+
+    manager.unsubscribe_from_chat(user_id, other_chat)
+    assert str(other_chat) not in manager.outbound_stats()["chat_send_latency"]
+    manager.disconnect(ws, user_id)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_to_chat_without_subscribers():
+    manager = ConnectionManager()
+    result = await manager.broadcast_json_to_chat(uuid.uuid4(), {})
+    assert result.delivered == 0 and result.failed == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_delay_other_subscribers():
+    manager = ConnectionManager(send_timeout=0.2)
+    chat_id = uuid.uuid4()
+    slow_user = uuid.uuid4()
+    slow = StalledWebSocket()
+    await manager.connect(slow_user, slow)
+    manager.subscribe_to_chat(slow_user, chat_id)
+    fast = []
+    for _ in range(20):
+        user_id = uuid.uuid4()
+        ws = RecordingWebSocket()
+        await manager.connect(user_id, ws)
+        manager.subscribe_to_chat(user_id, chat_id)
+        fast.append(ws)
+
+    result = await manager.broadcast_json_to_chat(chat_id, {"message": "hi"})
+    await asyncio.sleep(0.01)
+
+    assert result.delivered == 21
+    assert all(ws.frames for ws in fast)
+
+    await asyncio.sleep(0.3)
+
+    assert slow.close_code == 1013
+    assert slow_user not in manager.active_connections
+    assert manager.outbound_stats()["evicted_connections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queue_evicts_with_close_policy():
+    manager = ConnectionManager(queue_high_water=2, slow_consumer_policy="close")
+    user_id = uuid.uuid4()
+    ws = StalledWebSocket()
+    await manager.connect(user_id, ws)
+
+    for _ in range(4):
+        await manager.send_json_to_user(user_id, {"message": "hi"})
+    await asyncio.sleep(0.01)
+
+    assert ws.close_code == 1013
+    assert ws not in manager.outbound_queues
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_oldest_with_drop_policy():
+    manager = ConnectionManager(queue_high_water=2, slow_consumer_policy="drop")
+    user_id = uuid.uuid4()
+    ws = StalledWebSocket()
+    await manager.connect(user_id, ws)
+
+    for i in range(5):
+        await manager.send_json_to_user(user_id, {"n": i})
+
+    stats = manager.outbound_stats()
+    assert stats["max_queue_depth"] == 2
+    assert stats["dropped_frames"] >= 2
+    assert ws.close_code is None
+    queued = [frame for frame, _, _ in manager.outbound_queues[ws].frames._queue]
+    assert queued[-1] == '{"n":4}'
+    manager.disconnect(ws, user_id)
+
+
+def test_chat_hooks_fire_on_first_and_last_local_subscriber():
+    manager = ConnectionManager()
+    added, removed = [], []
+    manager.on_chat_added = added.append
+    manager.on_chat_removed = removed.append
+    chat_id, user_one, user_two = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    manager.subscribe_to_chat(user_one, chat_id)
+    manager.subscribe_to_chat(user_two, chat_id)
+    assert added == [chat_id]
+
+    manager.unsubscribe_from_chat(user_one, chat_id)
+    assert removed == []
+
+    ws = object()
+    manager.active_connections[user_two] = {ws}
+    manager.disconnect(ws, user_two)
+    assert removed == [chat_id]
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.websockets import WebSocketState
+from pydantic import ValidationError
+
+from app_ws import router as ws_router
+from app_ws.services import ChatWSService
+from app_ws.utils import parse_ws_message
+from app_ws.ws_manager import ConnectionManager
+from shared.users.schemas import UserSlimS
+from shared.websocket.schemas import WSMessage, WSSubscribe
+from tests.test_ws_auth import ClientWebSocket
+from tests.test_ws_manager import RecordingWebSocket, drain
+
+
+def test_parse_picks_model_by_action():
+    chat_id = str(uuid.uuid4())
+
+    subscribe = parse_ws_message(f'{{"action":"subscribe","chat_ids":["{chat_id}"]}}')
+    message = parse_ws_message(
+        f'{{"action":"message","chat_id":"{chat_id}","text":"hi"}}'.encode()
+    )
+
+    assert isinstance(subscribe, WSSubscribe)
+    assert isinstance(message, WSMessage) and message.text == "hi"
+
+
+def test_parse_rejects_unknown_action_and_invalid_payload():
+    with pytest.raises(ValueError, match="Unknown action: ping"):
+        parse_ws_message('{"action":"ping"}')
+    with pytest.raises(ValueError, match="Unknown action"):
+        parse_ws_message("{}")
+    with pytest.raises(ValidationError):
+        parse_ws_message('{"action":"message","chat_id":"nope","text":""}')
+    with pytest.raises(ValidationError):
+        parse_ws_message("not json")
+
+
+def test_frame_is_encoded_once_and_stream_id_spliced():
+    frame = ChatWSService.encode_message_frame(
+        uuid.uuid4(), uuid.uuid4(), "alice", 'say "привет"', datetime.now(timezone.utc)
+    )
+
+    spliced = ChatWSService.with_stream_id(frame, "1724606194032-0")
+
+    assert json.loads(spliced) == {**json.loads(frame), "stream_id": "1724606194032-0"}
+
+
+async def test_bus_frame_is_forwarded_verbatim():
+    manager = ConnectionManager()
+    service = ChatWSService(manager)
+    chat_id, user_id = uuid.uuid4(), uuid.uuid4()
+    ws = RecordingWebSocket()
+    await manager.connect(user_id, ws)
+    manager.subscribe_to_chat(user_id, chat_id)
+    frame = ChatWSService.encode_message_frame(
+        uuid.uuid4(), chat_id, "alice", "hi", datetime.now(timezone.utc)
+    )
+
+    await service.handle_chat_frame(chat_id, frame)
+    await drain(manager)
+
+    assert ws.frames == [frame] and ws.frames[0] is frame
+    manager.disconnect(ws, user_id)
+
+
+async def test_failed_message_is_reported_and_keeps_the_socket(monkeypatch):
+    user = UserSlimS(
+        id=uuid.uuid4(), username="alice", is_active=True, is_superuser=False
+    )
+    failures = iter([ConnectionError("redis is down"), None])
+
+    async def authenticate(token):
+        return user
+
+    async def is_member(chat_id, user_id):
+        failure = next(failures)
+        if failure:
+            raise failure
+        return True
+
+    async def write(chat_id, user_id, text):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(ws_router, "authenticate_websocket", authenticate)
+    monkeypatch.setattr(ws_router.chat_members_cache, "is_member", is_member)
+    monkeypatch.setattr(ws_router.message_writer, "write", write)
+    ws = ClientWebSocket()
+    handler = asyncio.create_task(
+        ws_router.websocket_chat(ws, token="token", batch=False, heartbeat=False)
+    )
+    message = json.dumps(
+        {"action": "message", "chat_id": str(uuid.uuid4()), "text": "hi"}
+    )
+    for _ in range(2):
+        ws.incoming.put_nowait(message)
+    for _ in range(1000):
+        if len(ws.frames) >= 2 or handler.done():
+            break
+        await asyncio.sleep(0.001)
+
+    assert [json.loads(frame) for frame in ws.frames] == [
+        {
+            "action": "message_response",
+            "status": "error",
+            "error": "Couldn't send message",
+        }
+    ] * 2
+    assert ws.client_state == WebSocketState.CONNECTED
+    ws.incoming.put_nowait(WebSocketDisconnect())
+    await handler
@@ -0,0 +1,53 @@
+import json
+import uuid
+
+from app_ws.protocols import MSGPACK_PROTOCOL, negotiate_protocol, pack, unpack
+from app_ws.utils import parse_ws_message
+from app_ws.ws_manager import ConnectionManager
+from shared.websocket.schemas import WSSubscribe
+from tests.test_ws_manager import RecordingWebSocket, drain
+
+
+class BinaryWebSocket(RecordingWebSocket):
+    async def send_bytes(self, frame: bytes):
+        self.frames.append(frame)
+
+
+def test_negotiation_falls_back_to_json():
+    assert negotiate_protocol(["chat.v0", MSGPACK_PROTOCOL]) == MSGPACK_PROTOCOL
+    assert negotiate_protocol(["chat.v0"]) is None
+    assert negotiate_protocol([]) is None
+
+
+def test_msgpack_messages_are_parsed_like_json():
+    chat_id = uuid.uuid4()
+    ws_message = parse_ws_message(
+        pack({"action": "subscribe", "chat_ids": [str(chat_id)]}), MSGPACK_PROTOCOL
+    )
+    assert isinstance(ws_message, WSSubscribe)
+    assert ws_message.chat_ids == [chat_id]
+
+
+async def test_broadcast_encodes_once_per_protocol():
+    manager = ConnectionManager()
+    chat_id = uuid.uuid4()
+    json_sockets, msgpack_sockets = [], []
+    for _ in range(3):
+        user_id = uuid.uuid4()
+        json_ws, msgpack_ws = RecordingWebSocket(), BinaryWebSocket()
+        await manager.connect(user_id, json_ws)
+        await manager.connect(user_id, msgpack_ws, subprotocol=MSGPACK_PROTOCOL)
+        manager.subscribe_to_chat(user_id, chat_id)
+        json_sockets.append(json_ws)
+        msgpack_sockets.append(msgpack_ws)
+
+    frame = '{"message":"привет","chat_id":"%s"}' % chat_id
+    result = await manager.broadcast_text_to_chat(chat_id, frame)
+    await drain(manager)
+
+    assert result.delivered == 6
+    assert all(ws.frames[0] is frame for ws in json_sockets)
+    binary = msgpack_sockets[0].frames[0]
+    assert isinstance(binary, bytes)
+    assert all(ws.frames[0] is binary for ws in msgpack_sockets)
+    assert unpack(binary) == json.loads(frame)